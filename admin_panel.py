@@ -4,11 +4,18 @@ eyeMEI Database Admin Panel
 A web interface for reviewing lookup logs and managing the eyeMEI database.
 """
 
+import base64
+import bisect
+import copy
+import fcntl
 import json
 import os
 from datetime import datetime
 from flask import Flask, render_template, request, jsonify, redirect, url_for
 import logging
+import threading
+from contextlib import contextmanager
+from lookup_log import LogTail, LookupLogIndex, LookupLogStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,30 +25,426 @@ app = Flask(__name__, template_folder='admin_templates')
 # Database paths
 EYEMEI_JSON_PATH = 'databases/eyemei.json'
 LOOKUP_LOG_JSON_PATH = 'databases/lookup_log.json'
+LOOKUP_LOG_DIR = 'databases/lookup_log'
+
+PENDING_PAGE_SIZE = 25
+PENDING_MAX_PAGE_SIZE = 100
+
+def describe_lookup_device(lookup):
+    """Work out the (brand, model) a lookup should be grouped under for review."""
+    device_name = "Unknown Device"
+    brand_name = "Unknown Brand"
+    
+    # Check eyemei_device_info first
+    if lookup.get('eyemei_device_info'):
+        device_info = lookup['eyemei_device_info']
+        brand_name = device_info.get('brand', 'Unknown Brand')
+        device_name = device_info.get('model', 'Unknown Device')
+    
+    # Check secondary device info
+    elif lookup.get('secondary_device_info'):
+        device_info = lookup['secondary_device_info']
+        brand_name = device_info.get('brand', 'Unknown Brand')
+        device_name = device_info.get('model', 'Unknown Device')
+    
+    # Check provider results for device names
+    else:
+        for provider in lookup.get('provider_checks', []):
+            if provider.get('success') and provider.get('device_name'):
+                device_name = provider['device_name']
+                # Try to extract brand from device name
+                if ' ' in device_name:
+                    potential_brand = device_name.split()[0]
+                    if potential_brand.lower() not in ['unknown', 'device']:
+                        brand_name = potential_brand
+                break
+    
+    return brand_name, device_name
+
+def lookup_matches(lookup, country, database_type, since, until):
+    """Check a lookup summary against the pending-device filters."""
+    if country and (lookup.get('country') or '').lower() != country.lower():
+        return False
+    if database_type and lookup.get('database_type') != database_type:
+        return False
+    timestamp = lookup.get('timestamp') or ''
+    if since and timestamp < since:
+        return False
+    # A date-only bound includes the whole day
+    if until and timestamp[:len(until)] > until:
+        return False
+    return True
+
+def summarize_device(device, lookups):
+    """Build the compact per-device row returned by the pending devices API."""
+    timestamps = [lookup['timestamp'] for lookup in lookups if lookup.get('timestamp')]
+    return {
+        'key': device['key'],
+        'brand': device['brand'],
+        'model': device['model'],
+        'tacs': device['tacs'],
+        'lookup_count': len(lookups),
+        'first_seen': min(timestamps) if timestamps else None,
+        'last_seen': max(timestamps) if timestamps else None,
+        'countries': sorted({lookup['country'] for lookup in lookups if lookup.get('country')}),
+        'database_types': sorted({lookup['database_type'] for lookup in lookups if lookup.get('database_type')}),
+        'providers': sorted({provider['provider'] for provider in device['provider_info'] if provider.get('provider')})
+    }
+
+def sort_position(row, sort_field):
+    """Position of a row in the sort order: its sort value, then its device key."""
+    if sort_field == 'last_seen':
+        return [row['last_seen'] or '', row['key']]
+    return [row[sort_field], row['key']]
+
+def encode_cursor(sort, position):
+    return base64.urlsafe_b64encode(json.dumps([sort] + position).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort):
+    """Decode a page cursor for the given sort, raising ValueError if it doesn't fit."""
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(decoded, list) or len(decoded) != 3 or decoded[0] != sort:
+        raise ValueError('Invalid cursor')
+    value_type = str if sort == 'recent' else int
+    if not isinstance(decoded[1], value_type) or not isinstance(decoded[2], str):
+        raise ValueError('Invalid cursor')
+    return decoded[1:]
+
+class PendingDevicesView:
+    """Lookups grouped into pending devices, kept up to date incrementally.
+    
+    New log entries are read with a LogTail and folded into the groups, so a
+    page load only parses what was logged since the previous one. Adding or
+    ignoring a device drops its TACs from the groups directly. Only the
+    devices touched by new lookups, removed TACs or eyeMEI changes are
+    rebuilt; the rest keep their summaries.
+    """
+    
+    def __init__(self, manager):
+        self.manager = manager
+        self.lookup_log = manager.lookup_log
+        self.lock = threading.Lock()
+        self.tail = LogTail(self.lookup_log)
+        self.eyemei_signature = None
+        self.existing_tacs = set()
+        self.clear()
+    
+    def clear(self):
+        self.sequence = 0
+        self.total_lookups = 0
+        # device key -> {'brand', 'model', 'by_tac': {tac: {'lookups': [...], 'providers': [...]}}}
+        self.groups = {}
+        self.tac_groups = {}
+        self.tac_counts = {}
+        # device key -> (first pending sequence, device, summary row) for devices with pending TACs
+        self.devices = {}
+        # (first pending sequence, device key), sorted, i.e. in log order
+        self.device_order = []
+        # device keys whose entry in self.devices is out of date
+        self.dirty = set()
+        self.pending = None
+        self.pending_rows = None
+    
+    def add_lookup(self, lookup):
+        self.total_lookups += 1
+        tac = lookup.get('tac')
+        if not tac:
+            return
+        
+        self.sequence += 1
+        self.tac_counts[tac] = self.tac_counts.get(tac, 0) + 1
+        
+        brand_name, device_name = describe_lookup_device(lookup)
+        device_key = f"{brand_name}:{device_name}"
+        group = self.groups.get(device_key)
+        if group is None:
+            group = self.groups[device_key] = {'brand': brand_name, 'model': device_name, 'by_tac': {}}
+        self.tac_groups.setdefault(tac, set()).add(device_key)
+        
+        tac_info = group['by_tac'].setdefault(tac, {'lookups': [], 'providers': []})
+        tac_info['lookups'].append((self.sequence, {
+            'timestamp': lookup.get('timestamp'),
+            'imei': lookup.get('imei'),
+            'country': lookup.get('country'),
+            'database_type': lookup.get('database_type')
+        }))
+        for provider in lookup.get('provider_checks', []):
+            if provider.get('success'):
+                tac_info['providers'].append((self.sequence, json.dumps(provider, sort_keys=True), provider))
+        self.dirty.add(device_key)
+    
+    def drop_tacs(self, tacs):
+        for tac in tacs:
+            for device_key in self.tac_groups.pop(tac, ()):
+                group = self.groups[device_key]
+                del group['by_tac'][tac]
+                if not group['by_tac']:
+                    del self.groups[device_key]
+                self.dirty.add(device_key)
+            self.total_lookups -= self.tac_counts.pop(tac, 0)
+    
+    def refresh_existing_tacs(self):
+        """Reload the eyeMEI TAC set if eyemei.json changed since it was last read."""
+        signature = self.manager.eyemei.file_signature()
+        if signature == self.eyemei_signature:
+            return
+        
+        existing_tacs = set()
+        eyemei_data = self.manager.load_eyemei_db()
+        for brand_name, brand_info in eyemei_data.get('brands', {}).items():
+            for model_dict in brand_info.get('models', []):
+                for model_name, model_info in model_dict.items():
+                    existing_tacs.update(model_info.get('tacs', []))
+        # Only devices with a TAC that was added to or removed from eyeMEI change
+        for tac in existing_tacs ^ self.existing_tacs:
+            self.dirty.update(self.tac_groups.get(tac, ()))
+        self.existing_tacs = existing_tacs
+        self.eyemei_signature = signature
+    
+    def apply_new_entries(self):
+        reset, entries = self.tail.read_new()
+        if reset:
+            self.clear()
+        for _, _, lookup in entries:
+            self.add_lookup(lookup)
+    
+    def refresh(self):
+        """Fold in newly logged lookups and any eyeMEI database changes."""
+        with self.lock:
+            self.apply_new_entries()
+            self.refresh_existing_tacs()
+    
+    def remove_tacs(self, tacs):
+        """Remove the TACs from the lookup log and from the view, returning the entries removed."""
+        with self.lookup_log.locked(), self.lock:
+            # Nothing can be appended while the store is locked, so catching up first
+            # and syncing afterwards keeps the tail in step with the rewritten segments
+            self.apply_new_entries()
+            removed_count = self.lookup_log.rewrite_without_tacs(tacs)
+            self.drop_tacs(tacs)
+            self.tail.sync()
+        return removed_count
+    
+    def build_device(self, group):
+        """Return (first pending sequence, device, summary row) for a group, or None if nothing is pending."""
+        tacs = [tac for tac in group['by_tac'] if tac not in self.existing_tacs]
+        if not tacs:
+            return None
+        
+        lookups = sorted(item for tac in tacs for item in group['by_tac'][tac]['lookups'])
+        providers = sorted(
+            (item for tac in tacs for item in group['by_tac'][tac]['providers']),
+            key=lambda item: item[0]
+        )
+        unique_providers = {}
+        for _, provider_key, provider in providers:
+            unique_providers[provider_key] = provider
+        
+        device = {
+            'key': f"{group['brand']}:{group['model']}",
+            'brand': group['brand'],
+            'model': group['model'],
+            'tacs': sorted(tacs),
+            'lookups': [summary for _, summary in lookups],
+            'provider_info': list(unique_providers.values())
+        }
+        return lookups[0][0], device, summarize_device(device, device['lookups'])
+    
+    def update_devices(self):
+        """Rebuild the entries of the dirty devices and their place in the log order."""
+        for device_key in self.dirty:
+            old_entry = self.devices.pop(device_key, None)
+            if old_entry is not None:
+                del self.device_order[bisect.bisect_left(self.device_order, (old_entry[0], device_key))]
+            
+            group = self.groups.get(device_key)
+            entry = self.build_device(group) if group else None
+            if entry is not None:
+                self.devices[device_key] = entry
+                bisect.insort(self.device_order, (entry[0], device_key))
+        self.dirty.clear()
+        self.pending = None
+    
+    def pending_state(self):
+        """Return (devices, summary rows), updating only the devices that changed."""
+        self.refresh()
+        with self.lock:
+            if self.dirty:
+                self.update_devices()
+            if self.pending is None:
+                # Devices appear in order of their first pending lookup, as in the log
+                entries = [self.devices[device_key] for _, device_key in self.device_order]
+                self.pending = [device for _, device, _ in entries]
+                self.pending_rows = [row for _, _, row in entries]
+            return self.pending, self.pending_rows
+    
+    def pending_devices(self):
+        """Return the pending devices with all their lookups and provider info."""
+        return self.pending_state()[0]
+    
+    def query(self, brand=None, country=None, database_type=None, since=None, until=None,
+              sort='lookups', descending=True, cursor=None, limit=PENDING_PAGE_SIZE):
+        """Return one page of pending device summaries plus the cursor for the next page.
+        
+        Devices are filtered by brand (case-insensitive substring) and by
+        their lookups' country, database type and timestamp range; lookup
+        counts and dates only cover the matching lookups. Pages are sorted by
+        lookup count or most recent lookup, ties broken by device key.
+        """
+        devices, device_rows = self.pending_state()
+        filter_lookups = country or database_type or since or until
+        brand = brand.lower() if brand else None
+        
+        rows = []
+        for device, row in zip(devices, device_rows):
+            if brand and brand not in device['brand'].lower():
+                continue
+            if filter_lookups:
+                lookups = [lookup for lookup in device['lookups'] if lookup_matches(lookup, country, database_type, since, until)]
+                if not lookups:
+                    continue
+                row = summarize_device(device, lookups)
+            rows.append(row)
+        
+        sort_field = 'last_seen' if sort == 'recent' else 'lookup_count'
+        rows.sort(key=lambda row: sort_position(row, sort_field), reverse=descending)
+        
+        if cursor is not None:
+            if descending:
+                rows = [row for row in rows if sort_position(row, sort_field) < cursor]
+            else:
+                rows = [row for row in rows if sort_position(row, sort_field) > cursor]
+        
+        page = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(sort, sort_position(page[-1], sort_field))
+        
+        return {'devices': page, 'next_cursor': next_cursor, 'remaining': len(rows)}
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'total_lookups': self.total_lookups,
+                'unique_tacs': len(self.tac_counts)
+            }
+
+class EyeMEIStore:
+    """Write-through model of eyemei.json with atomic, locked saves.
+
+    Saves go to a temporary file that is fsynced and renamed over the
+    database while holding an exclusive file lock, so a crash never leaves a
+    truncated file and concurrent admins never overwrite each other's changes.
+    The parsed data is kept in memory and only re-read when the file changes.
+    """
+    
+    def __init__(self, json_path):
+        self.json_path = json_path
+        self.lock_path = f"{json_path}.lock"
+        self.lock = threading.RLock()
+        self.data = None
+        self.signature = None
+    
+    @contextmanager
+    def locked(self):
+        """Hold the database's exclusive lock, shared across processes."""
+        with self.lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def file_signature(self):
+        try:
+            stat = os.stat(self.json_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    
+    def load(self):
+        """Return the current data, re-reading the file only if it changed.
+        
+        The returned dict is shared; use transaction() to make changes.
+        """
+        with self.lock:
+            signature = self.file_signature()
+            if self.data is None or signature != self.signature:
+                if signature is None:
+                    data = {"brands": {}}
+                else:
+                    with open(self.json_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                self.data = data
+                self.signature = signature
+            return self.data
+    
+    def save(self, data):
+        """Atomically replace the database file with data."""
+        with self.locked():
+            self.write(data)
+    
+    def write(self, data):
+        """Write data via a fsynced temporary file and rename. The caller must hold locked()."""
+        directory = os.path.dirname(self.json_path) or '.'
+        tmp_path = f"{self.json_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.json_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        
+        self.data = data
+        self.signature = self.file_signature()
+    
+    @contextmanager
+    def transaction(self):
+        """Yield a private copy of the latest data and save it once on success.
+        
+        The lock is held throughout, so every change made inside the block is
+        committed in a single write and no other writer can interleave.
+        """
+        with self.locked():
+            data = copy.deepcopy(self.load())
+            yield data
+            self.write(data)
 
 class AdminDatabaseManager:
-    def __init__(self, eyemei_path, lookup_log_path):
+    def __init__(self, eyemei_path, lookup_log_dir, legacy_lookup_log_path=None):
         self.eyemei_path = eyemei_path
-        self.lookup_log_path = lookup_log_path
+        self.eyemei = EyeMEIStore(eyemei_path)
+        self.lookup_log = LookupLogStore(lookup_log_dir, legacy_json_path=legacy_lookup_log_path)
+        self.pending_view = PendingDevicesView(self)
+        self.lookup_index = LookupLogIndex(self.lookup_log)
     
     def load_lookup_log(self):
         """Load the lookup log database."""
         try:
-            if os.path.exists(self.lookup_log_path):
-                with open(self.lookup_log_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {"lookups": [], "stats": {"total_lookups": 0}}
+            return self.lookup_log.load()
         except Exception as e:
             logger.error(f"Error loading lookup log: {e}")
             return {"lookups": [], "stats": {"total_lookups": 0}}
     
     def load_eyemei_db(self):
-        """Load the eyeMEI database."""
+        """Load the eyeMEI database (shared, read-only)."""
         try:
-            if os.path.exists(self.eyemei_path):
-                with open(self.eyemei_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {"brands": {}}
+            return self.eyemei.load()
         except Exception as e:
             logger.error(f"Error loading eyeMEI database: {e}")
             return {"brands": {}}
@@ -49,168 +452,116 @@ class AdminDatabaseManager:
     def save_eyemei_db(self, data):
         """Save the eyeMEI database."""
         try:
-            with open(self.eyemei_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
+            self.eyemei.save(data)
             return True
         except Exception as e:
             logger.error(f"Error saving eyeMEI database: {e}")
             return False
     
-    def save_lookup_log(self, data):
-        """Save the lookup log database."""
-        try:
-            with open(self.lookup_log_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return True
-        except Exception as e:
-            logger.error(f"Error saving lookup log: {e}")
-            return False
-    
     def get_pending_entries(self):
         """Get lookup entries that could be added to eyeMEI database."""
-        lookup_data = self.load_lookup_log()
-        eyemei_data = self.load_eyemei_db()
-        
-        # Get existing TACs from eyeMEI database
-        existing_tacs = set()
-        for brand_name, brand_info in eyemei_data.get('brands', {}).items():
-            for model_dict in brand_info.get('models', []):
-                for model_name, model_info in model_dict.items():
-                    existing_tacs.update(model_info.get('tacs', []))
-        
-        # Find unique device info from lookup log
-        pending_devices = {}
-        for lookup in lookup_data.get('lookups', []):
-            tac = lookup.get('tac')
-            if not tac or tac in existing_tacs:
-                continue
-            
-            # Try to get device info from various sources
-            device_info = None
-            device_name = "Unknown Device"
-            brand_name = "Unknown Brand"
-            
-            # Check eyemei_device_info first
-            if lookup.get('eyemei_device_info'):
-                device_info = lookup['eyemei_device_info']
-                brand_name = device_info.get('brand', 'Unknown Brand')
-                device_name = device_info.get('model', 'Unknown Device')
-            
-            # Check secondary device info
-            elif lookup.get('secondary_device_info'):
-                device_info = lookup['secondary_device_info']
-                brand_name = device_info.get('brand', 'Unknown Brand')
-                device_name = device_info.get('model', 'Unknown Device')
-            
-            # Check provider results for device names
-            else:
-                for provider in lookup.get('provider_checks', []):
-                    if provider.get('success') and provider.get('device_name'):
-                        device_name = provider['device_name']
-                        # Try to extract brand from device name
-                        if ' ' in device_name:
-                            potential_brand = device_name.split()[0]
-                            if potential_brand.lower() not in ['unknown', 'device']:
-                                brand_name = potential_brand
-                        break
-            
-            # Create unique key for grouping
-            device_key = f"{brand_name}:{device_name}"
-            
-            if device_key not in pending_devices:
-                pending_devices[device_key] = {
-                    'brand': brand_name,
-                    'model': device_name,
-                    'tacs': [],
-                    'lookups': [],
-                    'provider_info': []
-                }
-            
-            pending_devices[device_key]['tacs'].append(tac)
-            pending_devices[device_key]['lookups'].append({
-                'timestamp': lookup.get('timestamp'),
-                'imei': lookup.get('imei'),
-                'country': lookup.get('country'),
-                'database_type': lookup.get('database_type')
-            })
-            
-            # Add provider information
-            for provider in lookup.get('provider_checks', []):
-                if provider.get('success'):
-                    pending_devices[device_key]['provider_info'].append(provider)
-        
-        # Remove duplicates and sort
-        for device in pending_devices.values():
-            device['tacs'] = sorted(list(set(device['tacs'])))
-            device['provider_info'] = list({json.dumps(p, sort_keys=True): p for p in device['provider_info']}.values())
-        
-        return list(pending_devices.values())
+        return self.pending_view.pending_devices()
     
     def add_device_to_eyemei(self, brand, model, tacs, alt_names=None, image=""):
         """Add a device to the eyeMEI database."""
+        return self.add_devices_to_eyemei([{
+            'brand': brand,
+            'model': model,
+            'tacs': tacs,
+            'alt_names': alt_names,
+            'image': image
+        }])
+    
+    def add_devices_to_eyemei(self, devices):
+        """Add several devices to the eyeMEI database in a single write."""
         try:
-            eyemei_data = self.load_eyemei_db()
-            
-            if 'brands' not in eyemei_data:
-                eyemei_data['brands'] = {}
-            
-            if brand not in eyemei_data['brands']:
-                eyemei_data['brands'][brand] = {'models': []}
-            
-            # Create new model entry
-            new_model = {
-                model: {
-                    'tacs': tacs if isinstance(tacs, list) else [tacs],
-                    'alt_names': alt_names or [],
-                    'image': image
-                }
-            }
-            
-            eyemei_data['brands'][brand]['models'].append(new_model)
-            
-            return self.save_eyemei_db(eyemei_data)
+            with self.eyemei.transaction() as eyemei_data:
+                if 'brands' not in eyemei_data:
+                    eyemei_data['brands'] = {}
+                
+                for device in devices:
+                    brand = device['brand']
+                    tacs = device['tacs']
+                    
+                    if brand not in eyemei_data['brands']:
+                        eyemei_data['brands'][brand] = {'models': []}
+                    
+                    # Create new model entry
+                    new_model = {
+                        device['model']: {
+                            'tacs': tacs if isinstance(tacs, list) else [tacs],
+                            'alt_names': device.get('alt_names') or [],
+                            'image': device.get('image', '')
+                        }
+                    }
+                    
+                    eyemei_data['brands'][brand]['models'].append(new_model)
+            return True
         except Exception as e:
-            logger.error(f"Error adding device to eyeMEI: {e}")
+            logger.error(f"Error adding devices to eyeMEI: {e}")
             return False
     
     def remove_processed_lookups(self, tacs_to_remove):
         """Remove lookup entries for processed TACs."""
         try:
-            lookup_data = self.load_lookup_log()
-            original_count = len(lookup_data.get('lookups', []))
-            
-            # Filter out lookups with the specified TACs
-            lookup_data['lookups'] = [
-                lookup for lookup in lookup_data.get('lookups', [])
-                if lookup.get('tac') not in tacs_to_remove
-            ]
-            
-            removed_count = original_count - len(lookup_data['lookups'])
+            removed_count = self.pending_view.remove_tacs(tacs_to_remove)
             logger.info(f"Removed {removed_count} lookup entries for processed TACs")
-            
-            return self.save_lookup_log(lookup_data)
+            return True
         except Exception as e:
             logger.error(f"Error removing processed lookups: {e}")
             return False
 
 # Initialize database manager
-db_manager = AdminDatabaseManager(EYEMEI_JSON_PATH, LOOKUP_LOG_JSON_PATH)
+db_manager = AdminDatabaseManager(EYEMEI_JSON_PATH, LOOKUP_LOG_DIR, LOOKUP_LOG_JSON_PATH)
 
 @app.route('/')
 def index():
     """Main admin panel page."""
     pending_devices = db_manager.get_pending_entries()
-    lookup_data = db_manager.load_lookup_log()
     
-    stats = {
-        'total_lookups': len(lookup_data.get('lookups', [])),
-        'pending_devices': len(pending_devices),
-        'unique_tacs': len(set(lookup.get('tac') for lookup in lookup_data.get('lookups', []) if lookup.get('tac')))
-    }
+    stats = db_manager.pending_view.stats()
+    stats['pending_devices'] = len(pending_devices)
     
-    return render_template('admin_index.html', 
-                         pending_devices=pending_devices, 
-                         stats=stats)
+    return render_template('admin_index.html', stats=stats)
+
+@app.route('/api/pending_devices')
+def pending_devices():
+    """Page through pending devices with optional filters and sorting."""
+    sort = request.args.get('sort', 'lookups')
+    if sort not in ('lookups', 'recent'):
+        return jsonify({'success': False, 'error': "sort must be 'lookups' or 'recent'"}), 400
+    
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        return jsonify({'success': False, 'error': "order must be 'asc' or 'desc'"}), 400
+    
+    try:
+        limit = int(request.args.get('limit', PENDING_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be a number'}), 400
+    limit = max(1, min(limit, PENDING_MAX_PAGE_SIZE))
+    
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor, sort)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    else:
+        cursor = None
+    
+    page = db_manager.pending_view.query(
+        brand=request.args.get('brand', '').strip() or None,
+        country=request.args.get('country', '').strip() or None,
+        database_type=request.args.get('database_type', '').strip() or None,
+        since=request.args.get('since', '').strip() or None,
+        until=request.args.get('until', '').strip() or None,
+        sort=sort,
+        descending=order == 'desc',
+        cursor=cursor,
+        limit=limit
+    )
+    return jsonify(page)
 
 @app.route('/api/add_device', methods=['POST'])
 def add_device():
@@ -235,6 +586,41 @@ def add_device():
     else:
         return jsonify({'success': False, 'error': 'Failed to add device'}), 500
 
+@app.route('/api/add_devices', methods=['POST'])
+def add_devices():
+    """Add several devices to the eyeMEI database in one write."""
+    data = request.get_json()
+    
+    devices = []
+    for device in data.get('devices', []):
+        brand = device.get('brand', '').strip()
+        model = device.get('model', '').strip()
+        tacs = device.get('tacs', [])
+        
+        if not brand or not model or not tacs:
+            return jsonify({'success': False, 'error': 'Brand, model, and TACs are required for every device'}), 400
+        
+        devices.append({
+            'brand': brand,
+            'model': model,
+            'tacs': tacs if isinstance(tacs, list) else [tacs],
+            'alt_names': device.get('alt_names', []),
+            'image': device.get('image', '').strip()
+        })
+    
+    if not devices:
+        return jsonify({'success': False, 'error': 'No devices given'}), 400
+    
+    success = db_manager.add_devices_to_eyemei(devices)
+    
+    if success:
+        # Remove processed lookups for every added device in one rewrite
+        processed_tacs = [tac for device in devices for tac in device['tacs']]
+        db_manager.remove_processed_lookups(processed_tacs)
+        return jsonify({'success': True, 'added': len(devices)})
+    else:
+        return jsonify({'success': False, 'error': 'Failed to add devices'}), 500
+
 @app.route('/api/ignore_device', methods=['POST'])
 def ignore_device():
     """Remove device lookups without adding to database."""
@@ -254,14 +640,12 @@ def ignore_device():
 @app.route('/api/lookup_details/<tac>')
 def lookup_details(tac):
     """Get detailed lookup information for a specific TAC."""
-    lookup_data = db_manager.load_lookup_log()
-    
-    details = []
-    for lookup in lookup_data.get('lookups', []):
-        if lookup.get('tac') == tac:
-            details.append(lookup)
-    
-    return jsonify(details)
+    return jsonify(db_manager.lookup_index.find(tac=tac))
+
+@app.route('/api/imei_details/<imei>')
+def imei_details(imei):
+    """Get detailed lookup information for a specific IMEI."""
+    return jsonify(db_manager.lookup_index.find(imei=imei))
 
 if __name__ == '__main__':
     # Create admin templates directory if it doesn't exist
@@ -1,10 +1,23 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from http.cookiejar import DefaultCookiePolicy
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from flask import Flask, Response, g, render_template, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import os
+import queue
+import threading
+import time
+import atexit
+import metrics
+from lookup_log import LookupLogStore
+from tac_index import MappedTacIndex, default_index_path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -54,132 +67,553 @@ ISTHISPHONEBLOCKED_JSON_PATH = 'databases/isthisphoneblocked.json'
 RANDOMMER_JSON_PATH = 'databases/randommer.json'
 LOOKUP_LOG_JSON_PATH = 'databases/lookup_log.json'
 
+# How often (in seconds) databases check whether their files changed on disk
+DATABASE_RELOAD_INTERVAL = 5
+LOOKUP_LOG_DIR = 'databases/lookup_log'
+LOOKUP_LOG_BATCH_SIZE = 100
+LOOKUP_LOG_FLUSH_INTERVAL = 0.25
+
+# Overall time budget for all provider checks of a single lookup, in seconds.
+# Checks run concurrently, so this bounds the request at max(provider) rather
+# than sum(provider).
+PROVIDER_CHECK_DEADLINE = 16
+# Threads per provider. Each provider has its own pool so a slow carrier can
+# only hold up its own checks.
+PROVIDER_CHECK_WORKERS = 16
+
+# Limits for /api/lookup/batch. Concurrency is the number of IMEIs whose
+# provider checks run at the same time.
+BATCH_LOOKUP_MAX_IMEIS = 500
+BATCH_LOOKUP_DEFAULT_CONCURRENCY = 4
+BATCH_LOOKUP_MAX_CONCURRENCY = 8
+# Time budget for all provider checks of a batch, in seconds. Kept under
+# gunicorn's default 30 second worker timeout; IMEIs not reached in time get
+# cached results where available and 'Timeout' otherwise.
+BATCH_LOOKUP_DEADLINE = 20
+
+# Provider results are cached per TAC (Telstra) or per IMEI (AMTA, AT&T).
+# Failed checks are cached for a much shorter time so outages recover quickly.
+PROVIDER_CACHE_TTLS = {
+    'telstra': 24 * 60 * 60,
+    'amta': 60 * 60,
+    'att': 60 * 60,
+}
+PROVIDER_CACHE_ERROR_TTL = 60
+PROVIDER_CACHE_MAX_ENTRIES = 10000
+
+# Connection pooling for provider sessions. Only connection failures are
+# retried, since the request never reached the provider in that case.
+PROVIDER_POOL_SIZE = PROVIDER_CHECK_WORKERS
+PROVIDER_CONNECT_RETRIES = 2
+PROVIDER_RETRY_BACKOFF = 0.3
+# (connect, read) timeout for provider requests. Each retry gets a fresh
+# connect timeout, so it is kept short and the read timeout gets what is left:
+# a check that times out on every connection attempt and then on the response
+# still frees its thread by PROVIDER_CHECK_DEADLINE. urllib3 sleeps
+# backoff * 2 ** (n - 1) before the nth retry, except the first.
+PROVIDER_CONNECT_TIMEOUT = 2
+PROVIDER_READ_TIMEOUT = (
+    PROVIDER_CHECK_DEADLINE
+    - (PROVIDER_CONNECT_RETRIES + 1) * PROVIDER_CONNECT_TIMEOUT
+    - sum(PROVIDER_RETRY_BACKOFF * 2 ** (n - 1) for n in range(2, PROVIDER_CONNECT_RETRIES + 1))
+)
+PROVIDER_TIMEOUT = (PROVIDER_CONNECT_TIMEOUT, PROVIDER_READ_TIMEOUT)
+
 class IMEIDatabase:
-    def __init__(self, json_path):
+    def __init__(self, json_path, index_path=None, reload_interval=DATABASE_RELOAD_INTERVAL):
         self.json_path = json_path
-        self.data = self.load_database()
-        
-    def load_database(self):
-        """Load the JSON database."""
+        self.name = os.path.splitext(os.path.basename(json_path))[0]
+        self.index_path = index_path or default_index_path(json_path)
+        self.reload_interval = reload_interval
+        self.reload_lock = threading.Lock()
+        self.reload_count = 0
+        self.last_reload_error = None
+        self.next_reload_check = time.monotonic() + reload_interval
+        self.signature = self.file_signature()
         try:
-            if os.path.exists(self.json_path):
-                with open(self.json_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                
-                brands_data = data.get('brands', {})
-                total_brands = len(brands_data)
-                total_tacs = 0
-                total_models = 0
-                
-                for brand_name, brand_info in brands_data.items():
-                    models = brand_info.get('models', [])
-                    total_models += len(models)
-                    for model_dict in models:
-                        for model_name, model_info in model_dict.items():
-                            tacs = model_info.get('tacs', [])
-                            total_tacs += len(tacs)
-                
-                estimated_devices = total_tacs * 1_000_000
-                
-                logger.info(f"Loaded database {os.path.basename(self.json_path)}: "
-                           f"{total_brands:,} brands, {total_models:,} models, "
-                           f"{total_tacs:,} TACs, ~{estimated_devices:,} estimated unique devices")
-                return data
-            else:
-                logger.warning(f"Database file not found: {self.json_path}")
-                return {"brands": {}}
+            self.data, self.tac_index = self.load_database()
         except Exception as e:
             logger.error(f"Error loading database {self.json_path}: {e}")
-            return {"brands": {}}
+            self.data, self.tac_index = {"brands": {}}, {}
+        self.last_loaded = datetime.now().isoformat()
     
-    def lookup_tac(self, tac):
-        """Look up device information by TAC."""
-        brands_data = self.data.get('brands', {})
+    def file_signature(self):
+        """Identify the current versions of the JSON and index files."""
+        signature = []
+        for path in (self.json_path, self.index_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def load_mapped_index(self):
+        """Memory-map the compiled TAC index if one exists for the current JSON file."""
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            mapped_index = MappedTacIndex(self.index_path)
+        except Exception as e:
+            logger.error(f"Error loading TAC index {self.index_path}: {e}")
+            return None
+        
+        if not mapped_index.is_current(self.json_path):
+            logger.warning(f"TAC index {os.path.basename(self.index_path)} is older than "
+                           f"{os.path.basename(self.json_path)}, loading JSON instead "
+                           f"(rebuild it with tac_index.py)")
+            mapped_index.close()
+            return None
+        
+        logger.info(f"Memory-mapped TAC index {os.path.basename(self.index_path)}: "
+                   f"{mapped_index.total_brands:,} brands, {mapped_index.total_models:,} models, "
+                   f"{mapped_index.total_tacs:,} TACs")
+        return mapped_index
+        
+    def load_database(self):
+        """Load the database and build its TAC index, returning (data, tac_index).
+        
+        Uses the memory-mapped binary index when it is up to date, in which
+        case the JSON is not parsed and data is None. Raises if the JSON
+        can't be read.
+        """
+        mapped_index = self.load_mapped_index()
+        if mapped_index is not None:
+            return None, mapped_index
+        
+        if not os.path.exists(self.json_path):
+            logger.warning(f"Database file not found: {self.json_path}")
+            return {"brands": {}}, {}
+        
+        with open(self.json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        brands_data = data.get('brands', {})
+        total_brands = len(brands_data)
+        total_tacs = 0
+        total_models = 0
+        tac_index = {}
         
         for brand_name, brand_info in brands_data.items():
             models = brand_info.get('models', [])
+            total_models += len(models)
             for model_dict in models:
                 for model_name, model_info in model_dict.items():
                     tacs = model_info.get('tacs', [])
-                    if tac in tacs:
-                        image = model_info.get('image', '')
-                        if not image:
-                            image = 'public/images/devices/unknown-device.svg'
-                        
-                        return {
-                            'brand': brand_name,
-                            'model': model_name,
-                            'tac': tac,
-                            'alt_names': model_info.get('alt_names', []),
-                            'image': image
-                        }
+                    total_tacs += len(tacs)
+                    entry = (
+                        brand_name,
+                        model_name,
+                        model_info.get('alt_names', []),
+                        model_info.get('image', '')
+                    )
+                    for tac in tacs:
+                        # First occurrence wins, matching the old scan order
+                        tac_index.setdefault(tac, entry)
+        
+        estimated_devices = total_tacs * 1_000_000
+        
+        logger.info(f"Loaded database {os.path.basename(self.json_path)}: "
+                   f"{total_brands:,} brands, {total_models:,} models, "
+                   f"{total_tacs:,} TACs, ~{estimated_devices:,} estimated unique devices")
+        return data, tac_index
+    
+    def maybe_reload(self):
+        """Start a background reload if the database files changed.
+        
+        Files are checked at most once per reload_interval, and the request
+        thread never waits for the rebuild.
+        """
+        now = time.monotonic()
+        if now < self.next_reload_check:
+            return
+        self.next_reload_check = now + self.reload_interval
+        
+        if self.file_signature() == self.signature:
+            return
+        if not self.reload_lock.acquire(blocking=False):
+            return
+        
+        threading.Thread(target=self.reload, name=f"reload-{os.path.basename(self.json_path)}", daemon=True).start()
+    
+    def reload(self):
+        """Rebuild the index from disk and swap it in, keeping the old one if loading fails.
+        
+        Must be called with reload_lock held; releases it when done.
+        """
+        try:
+            signature = self.file_signature()
+            data, tac_index = self.load_database()
+        except Exception as e:
+            # The signature is left alone so the next check retries
+            self.last_reload_error = str(e)
+            logger.error(f"Error reloading database {self.json_path}, keeping the previous version: {e}")
+        else:
+            self.data = data
+            self.tac_index = tac_index
+            self.signature = signature
+            self.reload_count += 1
+            self.last_loaded = datetime.now().isoformat()
+            self.last_reload_error = None
+            logger.info(f"Reloaded database {os.path.basename(self.json_path)} (reload #{self.reload_count})")
+        finally:
+            self.reload_lock.release()
+    
+    def status(self):
+        """Describe the loaded database for the status endpoint."""
+        return {
+            'file': os.path.basename(self.json_path),
+            'mode': 'mmap' if isinstance(self.tac_index, MappedTacIndex) else 'json',
+            'tacs': len(self.tac_index),
+            'reload_count': self.reload_count,
+            'last_loaded': self.last_loaded,
+            'last_reload_error': self.last_reload_error
+        }
+    
+    def lookup_tac(self, tac):
+        """Look up device information by TAC."""
+        self.maybe_reload()
+        entry = self.tac_index.get(tac)
+        self.count_lookup(entry is not None)
+        return format_device_info(tac, entry)
+    
+    def count_lookup(self, found):
+        metrics.DATABASE_LOOKUPS.labels(self.name, 'hit' if found else 'miss').inc()
+
+def format_device_info(tac, entry):
+    """Turn a (brand, model, alt_names, image) index entry into the API's device info."""
+    if entry is None:
         return None
+    
+    brand_name, model_name, alt_names, image = entry
+    if not image:
+        image = 'public/images/devices/unknown-device.svg'
+    
+    return {
+        'brand': brand_name,
+        'model': model_name,
+        'tac': tac,
+        'alt_names': alt_names,
+        'image': image
+    }
 
-class LookupLogger:
-    def __init__(self, json_path):
-        self.json_path = json_path
-        self.ensure_log_file_exists()
+class MultiDatabaseIndex:
+    """Merged TAC index over several databases, so one probe finds every source's match.
     
-    def ensure_log_file_exists(self):
-        """Ensure the log file exists with proper structure."""
-        if not os.path.exists(self.json_path):
-            os.makedirs(os.path.dirname(self.json_path), exist_ok=True)
-            initial_data = {
-                "lookups": [],
-                "stats": {
-                    "total_lookups": 0,
-                    "first_lookup": None,
-                    "last_lookup": None
-                }
+    The merged index is (re)built in the background whenever one of the
+    databases swaps in a new index; until it is ready, lookups probe each
+    database directly and return the same result. When any source is
+    memory-mapped, nothing is merged: copying its records into a dict would
+    cost more memory than the mmap saves, and probing each index is already
+    a handful of binary searches.
+    """
+    
+    def __init__(self, sources):
+        # sources: list of (name, display_name, IMEIDatabase), in priority order
+        self.sources = sources
+        self.state = None
+        self.build_lock = threading.Lock()
+        self.build_count = 0
+    
+    def current_indexes(self):
+        return tuple(database.tac_index for _, _, database in self.sources)
+    
+    @staticmethod
+    def direct(indexes):
+        """Whether to probe the indexes one by one instead of merging them."""
+        return any(isinstance(tac_index, MappedTacIndex) for tac_index in indexes)
+    
+    def rebuild(self, indexes):
+        """Merge the given database indexes. Must be called with build_lock held."""
+        try:
+            merged = {}
+            for position, tac_index in enumerate(indexes):
+                for tac, entry in tac_index.items():
+                    entries = merged.get(tac)
+                    if entries is None:
+                        entries = merged[tac] = [None] * len(indexes)
+                    entries[position] = entry
+            self.state = (indexes, merged)
+            self.build_count += 1
+            logger.info(f"Built merged TAC index: {len(merged):,} TACs across {len(indexes)} databases")
+        except Exception as e:
+            logger.error(f"Error building merged TAC index: {e}")
+        finally:
+            self.build_lock.release()
+    
+    def lookup_entries(self, tac):
+        """Return the index entry of each source for a TAC (None where it's missing)."""
+        for _, _, database in self.sources:
+            database.maybe_reload()
+        
+        indexes = self.current_indexes()
+        if self.direct(indexes):
+            # Let a merge from before the switch to mmap be freed
+            self.state = None
+            return [tac_index.get(tac) for tac_index in indexes]
+        
+        state = self.state
+        if state is not None and all(built is current for built, current in zip(state[0], indexes)):
+            return state[1].get(tac) or [None] * len(indexes)
+        
+        if self.build_lock.acquire(blocking=False):
+            threading.Thread(target=self.rebuild, args=(indexes,), name='merge-tac-index', daemon=True).start()
+        return [tac_index.get(tac) for tac_index in indexes]
+    
+    def status(self):
+        """Describe the merged index for the status endpoint."""
+        state = self.state
+        return {
+            'sources': [name for name, _, _ in self.sources],
+            'mode': 'direct' if self.direct(self.current_indexes()) else 'merged',
+            'tacs': len(state[1]) if state is not None else None,
+            'current': state is not None and all(
+                built is current for built, current in zip(state[0], self.current_indexes())
+            ),
+            'build_count': self.build_count
+        }
+    
+    def lookup(self, tac):
+        """Look up a TAC in every source, returning ({name: device_info or None}, [missing names])."""
+        matches = {}
+        missing = []
+        for (name, _, database), entry in zip(self.sources, self.lookup_entries(tac)):
+            database.count_lookup(entry is not None)
+            matches[name] = format_device_info(tac, entry)
+            if entry is None:
+                missing.append(name)
+        return matches, missing
+
+class ProviderResultCache:
+    """Thread-safe LRU cache of provider check results with per-provider TTLs."""
+    
+    def __init__(self, ttls, error_ttl, max_entries):
+        self.ttls = ttls
+        self.error_ttl = error_ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+    
+    def get(self, provider_id, key):
+        """Return a copy of the cached result, or None if missing or expired."""
+        cache_key = (provider_id, key)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(cache_key)
+                self.hits[provider_id] = self.hits.get(provider_id, 0) + 1
+                metrics.PROVIDER_CACHE_REQUESTS.labels(provider_id, 'hit').inc()
+                return dict(entry[1])
+            if entry is not None:
+                del self.entries[cache_key]
+                metrics.PROVIDER_CACHE_ENTRIES.set(len(self.entries))
+            self.misses[provider_id] = self.misses.get(provider_id, 0) + 1
+            metrics.PROVIDER_CACHE_REQUESTS.labels(provider_id, 'miss').inc()
+            return None
+    
+    def put(self, provider_id, key, result):
+        """Cache a result, using the short error TTL for unsuccessful checks."""
+        ttl = self.ttls.get(provider_id, 0) if result.get('success') else self.error_ttl
+        if ttl <= 0:
+            return
+        cache_key = (provider_id, key)
+        with self.lock:
+            self.entries[cache_key] = (time.monotonic() + ttl, dict(result))
+            self.entries.move_to_end(cache_key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            metrics.PROVIDER_CACHE_ENTRIES.set(len(self.entries))
+    
+    def stats(self):
+        """Return hit/miss counters per provider and the current cache size."""
+        with self.lock:
+            return {
+                'size': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': dict(self.hits),
+                'misses': dict(self.misses)
             }
-            with open(self.json_path, 'w', encoding='utf-8') as f:
-                json.dump(initial_data, f, indent=2, ensure_ascii=False)
+
+class SingleFlight:
+    """Share one in-flight call between concurrent callers asking for the same key."""
+    
+    def __init__(self, executor):
+        self.executor = executor
+        # key -> [future, number of callers still waiting on it]
+        self.in_flight = {}
+        # Reentrant because cancelling a future runs forget() on the same thread
+        self.lock = threading.RLock()
+        self.shared_calls = 0
+    
+    def submit(self, key, fn, *args):
+        """Return the pending future for key, or submit fn(*args) to the executor.
+        
+        Every caller must either wait for the future to finish or call release().
+        """
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry is not None:
+                entry[1] += 1
+                self.shared_calls += 1
+                metrics.PROVIDER_SHARED_CALLS.inc()
+                return entry[0]
+            future = self.executor.submit(fn, *args)
+            self.in_flight[key] = [future, 1]
+        future.add_done_callback(lambda done: self.forget(key, done))
+        return future
+    
+    def release(self, key, future):
+        """Stop waiting on future; cancel it if nobody else waits and it hasn't started yet."""
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry is None or entry[0] is not future:
+                return
+            entry[1] -= 1
+            if entry[1] == 0:
+                future.cancel()
+    
+    def forget(self, key, future):
+        with self.lock:
+            entry = self.in_flight.get(key)
+            if entry is not None and entry[0] is future:
+                del self.in_flight[key]
+
+class LookupLogger:
+    """Queue lookup entries and append them to the log store from a background thread."""
+    
+    def __init__(self, store, batch_size=LOOKUP_LOG_BATCH_SIZE, flush_interval=LOOKUP_LOG_FLUSH_INTERVAL):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.writer_pid = None
+        self.writer_lock = threading.Lock()
+        self.writer = None
+        atexit.register(self.close)
+    
+    def ensure_writer(self):
+        """Start the writer thread in this process (threads don't survive a gunicorn fork)."""
+        if self.writer_pid == os.getpid():
+            return
+        with self.writer_lock:
+            if self.writer_pid == os.getpid():
+                return
+            if self.writer_pid is not None:
+                self.queue = queue.Queue()
+            self.writer = threading.Thread(target=self.writer_loop, name='lookup-log-writer', daemon=True)
+            self.writer.start()
+            self.writer_pid = os.getpid()
+    
+    def make_entry(self, imei, tac, results):
+        """Build the log entry for one IMEI lookup."""
+        return {
+            "timestamp": datetime.now().isoformat(),
+            "imei": imei,
+            "tac": tac,
+            "database_type": results.get('database_type'),
+            "country": results.get('country'),
+            "eyemei_device_info": results.get('eyemei_device_info'),
+            "secondary_device_info": results.get('secondary_device_info'),
+            "secondary_db_name": results.get('secondary_db_name'),
+            "provider_checks": results.get('provider_checks', [])
+        }
     
     def log_lookup(self, imei, tac, results):
-        """Log an IMEI lookup with all results."""
+        """Queue an IMEI lookup with all results for logging."""
+        self.log_lookups([(imei, tac, results)])
+    
+    def log_lookups(self, lookups):
+        """Queue several (imei, tac, results) lookups to be written together."""
+        entries = [self.make_entry(imei, tac, results) for imei, tac, results in lookups]
+        if entries:
+            self.ensure_writer()
+            self.queue.put(entries)
+    
+    def write_batch(self, batch):
         try:
-            # Read current data
-            with open(self.json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            timestamp = datetime.now().isoformat()
-            
-            # Create lookup entry
-            lookup_entry = {
-                "timestamp": timestamp,
-                "imei": imei,
-                "tac": tac,
-                "database_type": results.get('database_type'),
-                "country": results.get('country'),
-                "eyemei_device_info": results.get('eyemei_device_info'),
-                "secondary_device_info": results.get('secondary_device_info'),
-                "secondary_db_name": results.get('secondary_db_name'),
-                "provider_checks": results.get('provider_checks', [])
-            }
-            
-            # Add to lookups list
-            data["lookups"].append(lookup_entry)
-            
-            # Update stats
-            data["stats"]["total_lookups"] += 1
-            data["stats"]["last_lookup"] = timestamp
-            if data["stats"]["first_lookup"] is None:
-                data["stats"]["first_lookup"] = timestamp
-            
-            # Keep only last 10000 lookups to prevent file from getting too large
-            if len(data["lookups"]) > 10000:
-                data["lookups"] = data["lookups"][-10000:]
-            
-            # Write back to file
-            with open(self.json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            started = time.perf_counter()
+            stats = self.store.append(batch)
+            metrics.LOOKUP_LOG_WRITE_DURATION.observe(time.perf_counter() - started)
+            metrics.LOOKUP_LOG_ENTRIES.inc(len(batch))
+            logger.info(f"Logged {len(batch)} lookup(s) (Total lookups: {stats['total_lookups']})")
+        except Exception as e:
+            logger.error(f"Error logging lookups: {e}")
+    
+    def writer_loop(self):
+        while True:
+            entries = self.queue.get()
+            if entries is None:
+                return
             
-            logger.info(f"Logged lookup for IMEI: {imei[:4]}****{imei[-4:]} (Total lookups: {data['stats']['total_lookups']})")
+            # Give concurrent requests a moment to join this batch
+            batch = list(entries)
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entries = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entries is None:
+                    stopping = True
+                    break
+                batch.extend(entries)
             
-        except Exception as e:
-            logger.error(f"Error logging lookup: {e}")
+            self.write_batch(batch)
+            if stopping:
+                return
+    
+    def close(self):
+        """Stop the writer thread after it has written everything queued."""
+        if self.writer_pid != os.getpid():
+            return
+        self.queue.put(None)
+        self.writer.join(timeout=10)
+        self.writer_pid = None
+
+def create_provider_session():
+    """Create a keep-alive HTTP session with a connection pool sized for the provider workers."""
+    session = requests.Session()
+    retry = Retry(
+        total=PROVIDER_CONNECT_RETRIES,
+        connect=PROVIDER_CONNECT_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=PROVIDER_RETRY_BACKOFF
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PROVIDER_POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # Don't carry cookies set by a provider over to other users' lookups
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
 
 class ExternalProviders:
+    # Sessions are created lazily per process so pooled connections are never shared across a fork
+    sessions = {}
+    sessions_pid = None
+    sessions_lock = threading.Lock()
+
+    @staticmethod
+    def session(provider_id):
+        """Get this process's pooled session for a provider."""
+        with ExternalProviders.sessions_lock:
+            if ExternalProviders.sessions_pid != os.getpid():
+                ExternalProviders.sessions = {}
+                ExternalProviders.sessions_pid = os.getpid()
+            session = ExternalProviders.sessions.get(provider_id)
+            if session is None:
+                session = create_provider_session()
+                ExternalProviders.sessions[provider_id] = session
+            return session
+
     @staticmethod
     def check_telstra_3g(tac):
         """Check Telstra 3G compatibility (Australia)."""
@@ -187,7 +621,7 @@ class ExternalProviders:
             url = "https://www.telstrawholesale.com.au/bin/tw/TAC"
             data = {'tacnumber': tac}
             
-            response = requests.post(url, data=data, timeout=10)
+            response = ExternalProviders.session('telstra').post(url, data=data, timeout=PROVIDER_TIMEOUT)
             response.raise_for_status()
             
             result = response.json()
@@ -238,7 +672,7 @@ class ExternalProviders:
                 'imei': imei
             }
             
-            response = requests.post(url, headers=headers, data=data, timeout=10)
+            response = ExternalProviders.session('amta').post(url, headers=headers, data=data, timeout=PROVIDER_TIMEOUT)
             response.raise_for_status()
             
             result = response.json()
@@ -332,7 +766,7 @@ class ExternalProviders:
                 "mode": "byod"
             }
             
-            response = requests.post(url, headers=headers, cookies=cookies, json=data, timeout=15)
+            response = ExternalProviders.session('att').post(url, headers=headers, cookies=cookies, json=data, timeout=PROVIDER_TIMEOUT)
             
             if response.status_code == 400:
                 try:
@@ -440,11 +874,172 @@ class ExternalProviders:
         }
         return providers.get(country.lower(), [])
 
+    # Provider id -> display info, check method name and whether it needs the TAC or full IMEI
+    PROVIDERS = {
+        'telstra': {'provider': 'Telstra', 'country': 'Australia', 'check': 'check_telstra_3g', 'key': 'tac'},
+        'amta': {'provider': 'AMTA', 'country': 'Australia', 'check': 'check_amta_imei', 'key': 'imei'},
+        'att': {'provider': 'AT&T', 'country': 'USA', 'check': 'check_att_imei', 'key': 'imei'},
+    }
+
+    @staticmethod
+    def check(provider_id, argument):
+        """Run one provider check against the upstream service and cache its result."""
+        provider = ExternalProviders.PROVIDERS[provider_id]
+        started = time.perf_counter()
+        try:
+            result = getattr(ExternalProviders, provider['check'])(argument)
+        except Exception:
+            metrics.PROVIDER_CHECK_DURATION.labels(provider_id, 'error').observe(time.perf_counter() - started)
+            metrics.PROVIDER_CHECK_ERRORS.labels(provider_id).inc()
+            raise
+        outcome = 'success' if result.get('success') else 'error'
+        metrics.PROVIDER_CHECK_DURATION.labels(provider_id, outcome).observe(time.perf_counter() - started)
+        if outcome == 'error':
+            metrics.PROVIDER_CHECK_ERRORS.labels(provider_id).inc()
+        provider_cache.put(provider_id, argument, result)
+        return result
+
+    @staticmethod
+    def iter_checks(provider_ids, imei, tac, deadline=PROVIDER_CHECK_DEADLINE, end_time=None):
+        """Run provider checks concurrently and yield (position, result) as each completes.
+
+        Cached results are used without contacting the provider, and a check
+        already in flight for the same TAC/IMEI is joined rather than repeated.
+        Checks still running when the deadline passes are reported with a
+        'Timeout' status; they finish in the background and their results are
+        still cached, while checks still queued are cancelled unless another
+        lookup is waiting on them. end_time (a time.monotonic() value) caps the deadline for
+        callers sharing one budget across many lookups; once it has passed,
+        uncached checks are not started at all.
+        """
+        timeout_error = f'No response within {deadline} seconds'
+        check_end = time.monotonic() + deadline
+        if end_time is not None and end_time < check_end:
+            check_end = end_time
+            timeout_error = 'Batch time limit reached before a response'
+        
+        submitted = {}
+        not_started = []
+        for position, provider_id in enumerate(provider_ids):
+            provider = ExternalProviders.PROVIDERS[provider_id]
+            argument = tac if provider['key'] == 'tac' else imei
+            cached = provider_cache.get(provider_id, argument)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+            elif time.monotonic() >= check_end:
+                not_started.append(position)
+                continue
+            else:
+                future = provider_flights[provider_id].submit((provider_id, argument), ExternalProviders.check,
+                                                              provider_id, argument)
+            # Joined futures can be shared, so key by position rather than future
+            submitted[position] = (provider_id, provider, argument, future)
+        
+        pending = dict(submitted)
+        try:
+            while pending:
+                done, _ = wait([future for _, _, _, future in pending.values()],
+                               timeout=max(0, check_end - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for position in sorted(pending):
+                    _, provider, _, future = pending[position]
+                    if future not in done:
+                        continue
+                    del pending[position]
+                    try:
+                        # Copy, since concurrent lookups may share the same result
+                        yield position, dict(future.result())
+                    except Exception as e:
+                        logger.error(f"{provider['provider']} check failed: {e}")
+                        yield position, {
+                            'provider': provider['provider'],
+                            'country': provider['country'],
+                            'status': 'Error',
+                            'success': False,
+                            'error': str(e)
+                        }
+        finally:
+            # Also reached when a streaming client disconnects mid-lookup
+            for provider_id, _, argument, future in pending.values():
+                provider_flights[provider_id].release((provider_id, argument), future)
+        
+        for position in sorted(list(pending) + not_started):
+            provider_id = provider_ids[position]
+            provider = ExternalProviders.PROVIDERS[provider_id]
+            if position in pending:
+                logger.warning(f"{provider['provider']} check timed out: {timeout_error}")
+            metrics.PROVIDER_CHECK_TIMEOUTS.labels(provider_id).inc()
+            yield position, {
+                'provider': provider['provider'],
+                'country': provider['country'],
+                'status': 'Timeout',
+                'success': False,
+                'timed_out': True,
+                'error': timeout_error
+            }
+
+    @staticmethod
+    def run_checks(provider_ids, imei, tac, deadline=PROVIDER_CHECK_DEADLINE, end_time=None):
+        """Run provider checks concurrently and return results in provider_ids order."""
+        results = [None] * len(provider_ids)
+        for position, result in ExternalProviders.iter_checks(provider_ids, imei, tac, deadline, end_time):
+            results[position] = result
+        return results
+
+provider_cache = ProviderResultCache(PROVIDER_CACHE_TTLS, PROVIDER_CACHE_ERROR_TTL, PROVIDER_CACHE_MAX_ENTRIES)
+provider_flights = {
+    provider_id: SingleFlight(ThreadPoolExecutor(max_workers=PROVIDER_CHECK_WORKERS,
+                                                 thread_name_prefix=f'provider-{provider_id}'))
+    for provider_id in ExternalProviders.PROVIDERS
+}
+
 eyemei_db = IMEIDatabase(EYEMEI_JSON_PATH)
 osmocom_db = IMEIDatabase(OSMOCOM_JSON_PATH)
 isthisphoneblocked_db = IMEIDatabase(ISTHISPHONEBLOCKED_JSON_PATH)
 randommer_db = IMEIDatabase(RANDOMMER_JSON_PATH)
-lookup_logger = LookupLogger(LOOKUP_LOG_JSON_PATH)
+all_databases = MultiDatabaseIndex([
+    ('eyemei', 'eyeMEI', eyemei_db),
+    ('isthisphoneblocked', 'IsThisPhoneBlocked', isthisphoneblocked_db),
+    ('randommer', 'Randommer', randommer_db),
+    ('osmocom', 'OsmocomTAC', osmocom_db),
+])
+lookup_logger = LookupLogger(LookupLogStore(LOOKUP_LOG_DIR, legacy_json_path=LOOKUP_LOG_JSON_PATH))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and its latency under its route rather than its raw path.
+    
+    Streamed responses are recorded once the body has been sent, so their
+    latency includes the stream.
+    """
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    method = request.method
+    
+    def record():
+        metrics.HTTP_REQUESTS.labels(endpoint, method, str(response.status_code)).inc()
+        metrics.HTTP_REQUEST_DURATION.labels(endpoint).observe(time.perf_counter() - started)
+    
+    if response.is_streamed:
+        response.call_on_close(record)
+    else:
+        record()
+    return response
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Expose Prometheus metrics aggregated over all workers."""
+    body, content_type = metrics.render_metrics()
+    return Response(body, content_type=content_type)
 
 @app.route('/')
 def index():
@@ -466,71 +1061,335 @@ def serve_public_files(filename):
     """Serve files from the public directory."""
     return send_from_directory('public', filename)
 
-@app.route('/api/lookup', methods=['POST'])
-def lookup_imei():
-    """Perform IMEI lookup."""
-    data = request.get_json()
-    imei = data.get('imei', '').strip()
-    database_type = data.get('database_type', 'isthisphoneblocked')
-    country = data.get('country', 'australia').lower()
+@app.route('/api/database_status')
+def database_status():
+    """Report what each database has loaded and when it was last reloaded.
     
+    'all' (the merged index), provider_cache and provider_flights cover only
+    the worker that answers the request.
+    """
+    return jsonify({
+        'eyemei': eyemei_db.status(),
+        'osmocom': osmocom_db.status(),
+        'isthisphoneblocked': isthisphoneblocked_db.status(),
+        'randommer': randommer_db.status(),
+        'all': all_databases.status(),
+        'provider_cache': provider_cache.stats(),
+        'provider_flights': {provider_id: {'shared_calls': flights.shared_calls}
+                             for provider_id, flights in provider_flights.items()}
+    })
+
+def validate_imei(imei):
+    """Return an error message for an invalid IMEI, or None."""
     if not imei:
-        return jsonify({'error': 'IMEI is required'}), 400
-    
+        return 'IMEI is required'
     if not imei.isdigit() or len(imei) != 15:
-        return jsonify({'error': 'IMEI must be exactly 15 digits'}), 400
-    
-    tac = imei[:8]
-    eyemei_device_info = eyemei_db.lookup_tac(tac)
-    
+        return 'IMEI must be exactly 15 digits'
+    return None
+
+def get_secondary_database(database_type):
+    """Return the secondary database and its display name for a database_type."""
     if database_type == 'osmocom':
-        secondary_device_info = osmocom_db.lookup_tac(tac)
-        secondary_db_name = 'OsmocomTAC'
+        return osmocom_db, 'OsmocomTAC'
     elif database_type == 'randommer':
-        secondary_device_info = randommer_db.lookup_tac(tac)
-        secondary_db_name = 'Randommer'
+        return randommer_db, 'Randommer'
     else:
-        secondary_device_info = isthisphoneblocked_db.lookup_tac(tac)
-        secondary_db_name = 'IsThisPhoneBlocked'
+        return isthisphoneblocked_db, 'IsThisPhoneBlocked'
+
+class StageTimer:
+    """Time the stages of a request for the Server-Timing header and the timing log line."""
     
-    results = {
-        'imei': imei,
-        'tac': tac,
+    def __init__(self):
+        self.started = time.perf_counter()
+        # (name, seconds, description)
+        self.stages = []
+    
+    @contextmanager
+    def stage(self, name, description=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started, description)
+    
+    def add(self, name, seconds, description=None):
+        self.stages.append((name, seconds, description))
+    
+    def total(self):
+        return time.perf_counter() - self.started
+    
+    def server_timing(self):
+        """Format the stages, and the total so far, as a Server-Timing header value."""
+        entries = []
+        for name, seconds, description in self.stages + [('total', self.total(), None)]:
+            entry = f"{name};dur={seconds * 1000:.1f}"
+            if description:
+                entry += f';desc="{description}"'
+            entries.append(entry)
+        return ', '.join(entries)
+    
+    def log(self, **fields):
+        """Log one structured line with the stage durations in milliseconds."""
+        logger.info("Lookup timing: " + json.dumps({
+            **fields,
+            'total_ms': round(self.total() * 1000, 1),
+            'stages': {name: round(seconds * 1000, 1) for name, seconds, _ in self.stages}
+        }))
+
+def lookup_databases(tac, database_type, timer=None):
+    """Look up a TAC in eyeMEI and the requested secondary database(s).
+    
+    With database_type 'all', every database is checked in a single probe of
+    the merged index; the response then also lists each source's match and
+    which sources missed, and the secondary result is the first match.
+    Pass a StageTimer to time the database probes.
+    """
+    timer = timer or StageTimer()
+    if database_type == 'all':
+        with timer.stage('databases', 'All databases'):
+            matches, missing = all_databases.lookup(tac)
+        secondary_device_info = None
+        secondary_db_name = 'any database'
+        for name, display_name, _ in all_databases.sources:
+            if name != 'eyemei' and matches[name]:
+                secondary_device_info = matches[name]
+                secondary_db_name = display_name
+                break
+        return {
+            'eyemei_device_info': matches['eyemei'],
+            'secondary_device_info': secondary_device_info,
+            'secondary_db_name': secondary_db_name,
+            'sources': matches,
+            'missing_sources': missing
+        }
+    
+    secondary_db, secondary_db_name = get_secondary_database(database_type)
+    with timer.stage('eyemei', 'eyeMEI database'):
+        eyemei_device_info = eyemei_db.lookup_tac(tac)
+    with timer.stage('secondary', f'{secondary_db_name} database'):
+        secondary_device_info = secondary_db.lookup_tac(tac)
+    return {
         'eyemei_device_info': eyemei_device_info,
         'secondary_device_info': secondary_device_info,
-        'secondary_db_name': secondary_db_name,
+        'secondary_db_name': secondary_db_name
+    }
+
+def no_providers_result(country):
+    return {
+        'provider': 'No Providers Available',
+        'country': country.title(),
+        'status': 'No providers available for this country yet',
+        'success': False,
+        'error': f'No external providers are currently supported for {country.title()}'
+    }
+
+def build_lookup_result(imei, tac, database_results, database_type, country, provider_checks):
+    return {
+        'imei': imei,
+        'tac': tac,
+        **database_results,
         'database_type': database_type,
         'country': country,
-        'provider_checks': []
+        'provider_checks': provider_checks
     }
+
+@app.route('/api/lookup', methods=['POST'])
+def lookup_imei():
+    """Perform IMEI lookup.
     
-    available_providers = ExternalProviders.get_providers_for_country(country)
+    The response carries a Server-Timing header with the time spent in each
+    stage, and the same breakdown is logged as one JSON line per request.
+    """
+    timer = StageTimer()
+    with timer.stage('validation', 'Input validation'):
+        data = request.get_json()
+        imei = data.get('imei', '').strip()
+        database_type = data.get('database_type', 'isthisphoneblocked')
+        country = data.get('country', 'australia').lower()
+        error = validate_imei(imei)
     
-    if 'telstra' in available_providers:
-        telstra_result = ExternalProviders.check_telstra_3g(tac)
-        results['provider_checks'].append(telstra_result)
+    if error:
+        response = jsonify({'error': error})
+        response.status_code = 400
+        response.headers['Server-Timing'] = timer.server_timing()
+        timer.log(endpoint='/api/lookup', status=400, error=error)
+        return response
     
-    if 'amta' in available_providers:
-        amta_result = ExternalProviders.check_amta_imei(imei)
-        results['provider_checks'].append(amta_result)
+    tac = imei[:8]
+    database_results = lookup_databases(tac, database_type, timer)
     
-    if 'att' in available_providers:
-        att_result = ExternalProviders.check_att_imei(imei)
-        results['provider_checks'].append(att_result)
+    available_providers = ExternalProviders.get_providers_for_country(country)
+    if available_providers:
+        # Checks run concurrently, so each one is timed from the start of the checks until its result arrives
+        provider_checks = [None] * len(available_providers)
+        checks_started = time.perf_counter()
+        for position, result in ExternalProviders.iter_checks(available_providers, imei, tac):
+            provider_checks[position] = result
+            provider_id = available_providers[position]
+            timer.add(provider_id, time.perf_counter() - checks_started,
+                      f"{ExternalProviders.PROVIDERS[provider_id]['provider']} check")
+    else:
+        provider_checks = [no_providers_result(country)]
     
-    if not available_providers:
-        results['provider_checks'].append({
-            'provider': 'No Providers Available',
-            'country': country.title(),
-            'status': 'No providers available for this country yet',
-            'success': False,
-            'error': f'No external providers are currently supported for {country.title()}'
-        })
+    results = build_lookup_result(imei, tac, database_results, database_type, country, provider_checks)
     
     # Log the lookup
-    lookup_logger.log_lookup(imei, tac, results)
+    with timer.stage('logging', 'Lookup logging'):
+        lookup_logger.log_lookup(imei, tac, results)
+    
+    with timer.stage('serialization', 'JSON serialization'):
+        response = jsonify(results)
+    
+    response.headers['Server-Timing'] = timer.server_timing()
+    timer.log(endpoint='/api/lookup', status=200, tac=tac, database_type=database_type, country=country,
+              providers={provider_id: provider_checks[position].get('status')
+                         for position, provider_id in enumerate(available_providers)})
+    return response
+
+@app.route('/api/lookup/stream', methods=['POST'])
+def lookup_imei_stream():
+    """Perform IMEI lookup, streaming results as newline-delimited JSON.
+    
+    The first line carries the database results and the providers still being
+    checked, then one line per provider check as it completes (with its
+    position in provider_checks), then a final line with the complete result.
+    
+    Headers go out before the provider checks start, so the Server-Timing
+    header only covers validation and the database lookups. The timing log
+    line, written just before the final line, covers every stage.
+    """
+    timer = StageTimer()
+    with timer.stage('validation', 'Input validation'):
+        data = request.get_json()
+        imei = data.get('imei', '').strip()
+        database_type = data.get('database_type', 'isthisphoneblocked')
+        country = data.get('country', 'australia').lower()
+        error = validate_imei(imei)
+    
+    if error:
+        response = jsonify({'error': error})
+        response.status_code = 400
+        response.headers['Server-Timing'] = timer.server_timing()
+        timer.log(endpoint='/api/lookup/stream', status=400, error=error)
+        return response
+    
+    tac = imei[:8]
+    database_results = lookup_databases(tac, database_type, timer)
+    available_providers = ExternalProviders.get_providers_for_country(country)
+    
+    def generate():
+        results = build_lookup_result(imei, tac, database_results, database_type, country, [])
+        
+        yield json.dumps({
+            'type': 'databases',
+            **results,
+            'pending_providers': [
+                {key: ExternalProviders.PROVIDERS[provider_id][key] for key in ('provider', 'country')}
+                for provider_id in available_providers
+            ]
+        }) + '\n'
+        
+        if available_providers:
+            # Timed as in lookup_imei, from the start of the checks until each result arrives
+            provider_checks = [None] * len(available_providers)
+            checks_started = time.perf_counter()
+            for position, result in ExternalProviders.iter_checks(available_providers, imei, tac):
+                provider_checks[position] = result
+                provider_id = available_providers[position]
+                timer.add(provider_id, time.perf_counter() - checks_started,
+                          f"{ExternalProviders.PROVIDERS[provider_id]['provider']} check")
+                yield json.dumps({'type': 'provider_check', 'position': position, 'result': result}) + '\n'
+        else:
+            provider_checks = [no_providers_result(country)]
+            yield json.dumps({'type': 'provider_check', 'position': 0, 'result': provider_checks[0]}) + '\n'
+        
+        results['provider_checks'] = provider_checks
+        with timer.stage('logging', 'Lookup logging'):
+            lookup_logger.log_lookup(imei, tac, results)
+        
+        with timer.stage('serialization', 'JSON serialization'):
+            complete = json.dumps({'type': 'complete', **results}) + '\n'
+        
+        timer.log(endpoint='/api/lookup/stream', status=200, tac=tac, database_type=database_type, country=country,
+                  providers={provider_id: provider_checks[position].get('status')
+                             for position, provider_id in enumerate(available_providers)})
+        yield complete
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Server-Timing'] = timer.server_timing()
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/lookup/batch', methods=['POST'])
+def lookup_imei_batch():
+    """Perform IMEI lookups for a list of IMEIs.
+    
+    Accepts {"imeis": [...], "database_type": ..., "country": ..., "concurrency": ...}
+    and returns one result per submitted IMEI, in the same order. Invalid IMEIs
+    get an error entry instead of failing the whole batch.
+    """
+    data = request.get_json() or {}
+    imeis = data.get('imeis')
+    database_type = data.get('database_type', 'isthisphoneblocked')
+    country = data.get('country', 'australia').lower()
+    
+    if not isinstance(imeis, list) or not imeis:
+        return jsonify({'error': 'imeis must be a non-empty list'}), 400
     
-    return jsonify(results)
+    if len(imeis) > BATCH_LOOKUP_MAX_IMEIS:
+        return jsonify({'error': f'At most {BATCH_LOOKUP_MAX_IMEIS} IMEIs can be looked up per batch'}), 400
+    
+    try:
+        concurrency = int(data.get('concurrency', BATCH_LOOKUP_DEFAULT_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be a number'}), 400
+    concurrency = max(1, min(concurrency, BATCH_LOOKUP_MAX_CONCURRENCY))
+    
+    imeis = [str(imei).strip() for imei in imeis]
+    valid_imeis = list(dict.fromkeys(imei for imei in imeis if not validate_imei(imei)))
+    
+    # Resolve every distinct TAC against the local databases once
+    database_results = {}
+    for imei in valid_imeis:
+        tac = imei[:8]
+        if tac not in database_results:
+            database_results[tac] = lookup_databases(tac, database_type)
+    
+    available_providers = ExternalProviders.get_providers_for_country(country)
+    if available_providers:
+        # One budget for the whole batch, so a long list cannot outlast the worker timeout
+        batch_end = time.monotonic() + BATCH_LOOKUP_DEADLINE
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-lookup') as batch_executor:
+            provider_checks = dict(zip(valid_imeis, batch_executor.map(
+                lambda imei: ExternalProviders.run_checks(available_providers, imei, imei[:8], end_time=batch_end),
+                valid_imeis
+            )))
+    else:
+        provider_checks = {imei: [no_providers_result(country)] for imei in valid_imeis}
+    
+    results_by_imei = {}
+    for imei in valid_imeis:
+        tac = imei[:8]
+        results_by_imei[imei] = build_lookup_result(imei, tac, database_results[tac], database_type, country,
+                                                    provider_checks[imei])
+    
+    lookup_logger.log_lookups([(imei, imei[:8], results) for imei, results in results_by_imei.items()])
+    
+    batch_results = []
+    for imei in imeis:
+        if imei in results_by_imei:
+            batch_results.append(results_by_imei[imei])
+        else:
+            batch_results.append({'imei': imei, 'error': validate_imei(imei)})
+    
+    return jsonify({
+        'database_type': database_type,
+        'country': country,
+        'count': len(batch_results),
+        'results': batch_results
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -16,9 +16,12 @@ import requests
 import json
 import time
 import os
-from collections import defaultdict
+import copy
+import glob
+import argparse
+from collections import defaultdict, deque
 import threading
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import queue
 try:
     from colorama import init, Fore, Style, Cursor
@@ -35,9 +38,84 @@ except ImportError:
     class Cursor:
         UP = DOWN = ""
 
+# Minimum seconds between redraws of the live status line
+STATUS_UPDATE_INTERVAL = 0.2
+
+# Adaptive concurrency: start at INITIAL_CONCURRENCY requests in flight, add about one
+# per round of successful requests, and halve on 403/429/timeouts
+INITIAL_CONCURRENCY = 3
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 12
+CONCURRENCY_DECREASE_FACTOR = 0.5
+# After a backoff signal, pause new requests for this long, doubling while it continues
+BACKOFF_BASE_DELAY = 1
+BACKOFF_MAX_DELAY = 60
+REQUEST_TIMEOUT = 30
+# Number of recent request latencies kept for the status line
+LATENCY_WINDOW = 200
+
+# New TACs are appended to a journal next to randommer.json and folded into
+# the JSON snapshot by a background compaction every COMPACTION_INTERVAL additions
+JOURNAL_SUFFIX = ".journal"
+COMPACTION_INTERVAL = 25
+
+# Discovery saturation: once the share of new TACs over the last DISCOVERY_WINDOW
+# valid responses drops below the minimum yield, stop or slow down
+DISCOVERY_WINDOW = 500
+DEFAULT_MIN_YIELD = 0.01
+SATURATION_ACTIONS = ("stop", "slow")
+# While slowed down, wait this long between requests
+SATURATION_DELAY = 5
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on how many requests are in flight at once"""
+    
+    def __init__(self, initial=INITIAL_CONCURRENCY, minimum=MIN_CONCURRENCY, maximum=MAX_CONCURRENCY,
+                 decrease_factor=CONCURRENCY_DECREASE_FACTOR):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.backoff_delay = 0
+        self.paused_until = 0
+        self.last_decrease = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+    
+    def current_limit(self):
+        return int(self.limit)
+    
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    def pause_remaining(self):
+        return max(0, self.paused_until - time.monotonic())
+    
+    def record_latency(self, latency):
+        self.latencies.append(latency)
+    
+    def average_latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else 0
+    
+    def on_success(self):
+        """Additive increase: about one more slot per limit's worth of successes"""
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self.backoff_delay = 0
+    
+    def on_backoff(self):
+        """Multiplicative decrease, at most once per average request latency"""
+        now = time.monotonic()
+        self.backoff_delay = min(BACKOFF_MAX_DELAY, self.backoff_delay * 2 or BACKOFF_BASE_DELAY)
+        self.paused_until = max(self.paused_until, now + self.backoff_delay)
+        # Requests that were already in flight fail together; count them as one signal
+        if now - self.last_decrease < self.average_latency():
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.decrease_factor)
+
 
 class RandommerScraper:
-    def __init__(self):
+    def __init__(self, min_yield=DEFAULT_MIN_YIELD, saturation_action="stop", discovery_window=DISCOVERY_WINDOW):
         self.url = "https://randommer.io/imei-generator"
         self.headers = {
             "accept": "*/*",
@@ -78,16 +156,46 @@ class RandommerScraper:
         self.data = "id=1&X-Requested-With=XMLHttpRequest"
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.database_path = os.path.join(script_dir, "randommer.json")
+        self.journal_path = os.path.splitext(self.database_path)[0] + JOURNAL_SUFFIX
         self.database = {"brands": {}}
         self.database_lock = threading.Lock()
+        self.journal_file = None
+        self.journal_generation = 0
+        # Additions journaled since the last compaction, as (brand, model, tac)
+        self.journal_pending = []
+        # Copy of the database as of the last compaction, only touched under compaction_lock
+        self.snapshot = None
+        self.snapshot_models = {}
+        self.compaction_lock = threading.Lock()
+        self.compaction_event = threading.Event()
+        self.compaction_stopping = False
+        self.compaction_thread = None
         self.save_queue = queue.Queue()
         self.status_line_shown = False
         self.current_request_count = 0
         self.current_new_additions = 0
+        self.concurrency = AdaptiveConcurrency()
+        self.last_status_update = 0
+        self.total_brands = 0
+        self.total_models = 0
+        self.total_tacs = 0
+        self.brand_tac_counts = defaultdict(int)
+        self.min_yield = min_yield
+        self.saturation_action = saturation_action
+        self.slowed_down = False
+        # Whether each of the latest valid responses was a new TAC
+        self.discoveries = deque(maxlen=discovery_window)
+        # Schnabel capture-recapture sums per brand (and None for all brands): [samples,
+        # sum of TACs already known at each sample, samples that were already known]
+        self.recaptures = defaultdict(lambda: [0, 0, 0])
+        # casefolded brand -> brand name as stored in the database
+        self.brand_index = {}
+        # (brand, model) -> (model data in self.database, set of its TACs)
+        self.model_index = {}
         self.load_existing_database()
         
     def load_existing_database(self):
-        """Load existing database if it exists"""
+        """Load existing database if it exists, then replay its journal"""
         if os.path.exists(self.database_path):
             try:
                 with open(self.database_path, 'r', encoding='utf-8') as f:
@@ -101,31 +209,103 @@ class RandommerScraper:
             dir_path = os.path.dirname(self.database_path)
             if dir_path:
                 os.makedirs(dir_path, exist_ok=True)
+        
+        self.recount_stats()
+        self.build_indexes()
+        self.replay_journal()
+        self.reset_snapshot()
+        self.journal_file = open(self.journal_path, 'a', encoding='utf-8')
+    
+    def journal_generations(self):
+        """Return (generation, path) for journals rotated out by compactions still in progress"""
+        generations = []
+        for path in glob.glob(f"{self.journal_path}.*"):
+            suffix = path[len(self.journal_path) + 1:]
+            if suffix.isdigit():
+                generations.append((int(suffix), path))
+        return sorted(generations)
+    
+    def replay_journal(self):
+        """Apply additions journaled after the last snapshot was written"""
+        generations = self.journal_generations()
+        paths = [path for _, path in generations] + [self.journal_path]
+        if generations:
+            self.journal_generation = generations[-1][0]
+        
+        replayed = 0
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            brand, model, tac = json.loads(line)
+                        except (ValueError, TypeError):
+                            # Torn final line from an interrupted write
+                            continue
+                        _, tac_added = self.insert_tac(brand, model, tac)
+                        if tac_added:
+                            replayed += 1
+            except FileNotFoundError:
+                continue
+        
+        if replayed:
+            print(f"Replayed {replayed} TACs from the journal")
+    
+    def reset_snapshot(self):
+        """Start compactions from a copy of the current database"""
+        with self.compaction_lock:
+            self.snapshot = copy.deepcopy(self.database)
+            self.snapshot_models = {}
+            for brand_name, brand_data in self.snapshot["brands"].items():
+                for model_entry in brand_data["models"]:
+                    for model_name, model_data in model_entry.items():
+                        self.snapshot_models.setdefault((brand_name, model_name), model_data)
+    
+    def build_indexes(self):
+        """Index brands and models so lookups don't scan the database"""
+        self.brand_index = {}
+        self.model_index = {}
+        for brand_name, brand_data in self.database["brands"].items():
+            # First match wins, like the linear scans these replace
+            self.brand_index.setdefault(brand_name.casefold(), brand_name)
+            for model_entry in brand_data["models"]:
+                for model_name, model_data in model_entry.items():
+                    self.model_index.setdefault((brand_name, model_name), (model_data, set(model_data["tacs"])))
     
     def make_request(self):
-        """Make a single request to the API"""
+        """Make a single request to the API
+        
+        Returns (data, outcome) where outcome is 'ok', 'forbidden',
+        'throttled', 'timeout' or 'error'
+        """
         try:
             response = requests.post(
                 self.url,
                 headers=self.headers,
                 cookies=self.cookies,
                 data=self.data,
-                timeout=30
+                timeout=REQUEST_TIMEOUT
             )
             
             if response.status_code == 200:
-                return response.json()
+                return response.json(), 'ok'
             elif response.status_code == 403:
                 print(f"{Fore.RED}❌ Error 403: Access forbidden. You need to get a new cf_clearance cookie from your browser!{Style.RESET_ALL}")
                 print(f"{Fore.YELLOW}💡 Go to https://randommer.io/imei-generator, make a request, and copy the new cf_clearance cookie from browser dev tools{Style.RESET_ALL}")
-                return None
+                return None, 'forbidden'
+            elif response.status_code == 429:
+                print(f"{Fore.RED}❌ Error 429: Too many requests, backing off{Style.RESET_ALL}")
+                return None, 'throttled'
             else:
                 print(f"{Fore.RED}❌ Request failed with status code: {response.status_code}{Style.RESET_ALL}")
-                return None
+                return None, 'error'
                 
-        except requests.exceptions.RequestException as e:
+        except requests.exceptions.Timeout as e:
+            print(f"{Fore.RED}❌ Request timed out: {e}{Style.RESET_ALL}")
+            return None, 'timeout'
+        except (requests.exceptions.RequestException, ValueError) as e:
             print(f"{Fore.RED}❌ Request error: {e}{Style.RESET_ALL}")
-            return None
+            return None, 'error'
     
     def extract_tac(self, imei):
         """Extract TAC (first 8 digits) from IMEI"""
@@ -138,11 +318,7 @@ class RandommerScraper:
             
         brand = brand.strip()
         
-        for existing_brand in self.database["brands"]:
-            if existing_brand.lower() == brand.lower():
-                return existing_brand
-        
-        return brand
+        return self.brand_index.get(brand.casefold(), brand)
     
     def clean_model_name(self, model, brand):
         """Clean model name by removing brand prefix and invalid values"""
@@ -174,60 +350,144 @@ class RandommerScraper:
             return False
         
         with self.database_lock:
-            if normalized_brand not in self.database["brands"]:
-                self.database["brands"][normalized_brand] = {"models": []}
+            known_tacs = (self.brand_tac_counts.get(normalized_brand, 0), self.total_tacs)
+            brand_added, tac_added = self.insert_tac(normalized_brand, cleaned_model, tac)
+            self.record_discovery(normalized_brand, known_tacs, bool(tac_added))
+            if brand_added:
                 self.log_message(f"{Fore.CYAN}🆕 New brand added: {normalized_brand}{Style.RESET_ALL}")
             
-            model_found = False
-            tac_added = False
-            for model_entry in self.database["brands"][normalized_brand]["models"]:
-                for model_name, model_data in model_entry.items():
-                    if model_name == cleaned_model:
-                        if tac not in model_data["tacs"]:
-                            model_data["tacs"].append(tac)
-                            self.log_message(f"{Fore.GREEN}✅ Added TAC {tac} to existing model: {normalized_brand} {cleaned_model}{Style.RESET_ALL}")
-                            tac_added = True
-                        else:
-                            self.log_message(f"{Fore.YELLOW}🔄 TAC {tac} already exists for model: {normalized_brand} {cleaned_model}{Style.RESET_ALL}")
-                        model_found = True
-                        break
-                if model_found:
-                    break
-            
-            if not model_found:
-                new_model = {
-                    cleaned_model: {
-                        "tacs": [tac]
-                    }
-                }
-                self.database["brands"][normalized_brand]["models"].append(new_model)
-                self.log_message(f"{Fore.CYAN}🆕 New device added: {normalized_brand} {cleaned_model} with TAC {tac}{Style.RESET_ALL}")
-                tac_added = True
+            if tac_added:
+                self.journal_addition(normalized_brand, cleaned_model, tac)
+                if tac_added == 'model':
+                    self.log_message(f"{Fore.CYAN}🆕 New device added: {normalized_brand} {cleaned_model} with TAC {tac}{Style.RESET_ALL}")
+                else:
+                    self.log_message(f"{Fore.GREEN}✅ Added TAC {tac} to existing model: {normalized_brand} {cleaned_model}{Style.RESET_ALL}")
+            else:
+                self.log_message(f"{Fore.YELLOW}🔄 TAC {tac} already exists for model: {normalized_brand} {cleaned_model}{Style.RESET_ALL}")
             
-            return tac_added
+            return bool(tac_added)
+    
+    def insert_tac(self, brand, model, tac):
+        """Insert a TAC under an already normalized brand and model. The caller must hold database_lock.
+        
+        Returns (brand_added, tac_added) where tac_added is 'model' for a new model,
+        'tac' for a new TAC on an existing model, or False if the TAC was already there
+        """
+        brand_added = False
+        if brand not in self.database["brands"]:
+            self.database["brands"][brand] = {"models": []}
+            self.brand_index.setdefault(brand.casefold(), brand)
+            self.total_brands += 1
+            brand_added = True
+        
+        indexed_model = self.model_index.get((brand, model))
+        if indexed_model:
+            model_data, model_tacs = indexed_model
+            if tac in model_tacs:
+                return brand_added, False
+            model_tacs.add(tac)
+            model_data["tacs"].append(tac)
+            self.total_tacs += 1
+            self.brand_tac_counts[brand] += 1
+            return brand_added, 'tac'
+        
+        model_data = {"tacs": [tac]}
+        self.database["brands"][brand]["models"].append({model: model_data})
+        self.model_index[(brand, model)] = (model_data, {tac})
+        self.total_models += 1
+        self.total_tacs += 1
+        self.brand_tac_counts[brand] += 1
+        return brand_added, 'model'
+    
+    def journal_addition(self, brand, model, tac):
+        """Append a new TAC to the journal. The caller must hold database_lock."""
+        self.journal_file.write(json.dumps([brand, model, tac], ensure_ascii=False) + "\n")
+        self.journal_file.flush()
+        self.journal_pending.append((brand, model, tac))
     
     def save_database(self):
-        """Save database to file - thread safe"""
+        """Compact the journal into the JSON snapshot - thread safe
+        
+        Only rotating the journal happens under database_lock; the new
+        additions are applied to a private copy of the database and written
+        out without blocking the workers.
+        """
         try:
-            with self.database_lock:
-                with open(self.database_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.database, f, indent=4, ensure_ascii=False)
-                self.log_message(f"💾 Database saved to {self.database_path}")
+            with self.compaction_lock:
+                with self.database_lock:
+                    pending = self.journal_pending
+                    self.journal_pending = []
+                    self.journal_file.close()
+                    self.journal_generation += 1
+                    os.replace(self.journal_path, f"{self.journal_path}.{self.journal_generation}")
+                    self.journal_file = open(self.journal_path, 'a', encoding='utf-8')
+                    generation = self.journal_generation
+                
+                for brand, model, tac in pending:
+                    model_data = self.snapshot_models.get((brand, model))
+                    if model_data is None:
+                        brand_data = self.snapshot["brands"].setdefault(brand, {"models": []})
+                        model_data = {"tacs": []}
+                        brand_data["models"].append({model: model_data})
+                        self.snapshot_models[(brand, model)] = model_data
+                    model_data["tacs"].append(tac)
+                
+                tmp_path = f"{self.database_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.snapshot, f, indent=4, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.database_path)
+                
+                # Everything in the rotated journals is in the snapshot now
+                for journal_generation, path in self.journal_generations():
+                    if journal_generation <= generation:
+                        os.remove(path)
+                
+                self.log_message(f"💾 Database saved to {self.database_path} ({len(pending)} new TACs)")
         except Exception as e:
             self.log_message(f"{Fore.RED}❌ Error saving database: {e}{Style.RESET_ALL}")
     
+    def compaction_loop(self):
+        while True:
+            self.compaction_event.wait()
+            self.compaction_event.clear()
+            if self.compaction_stopping:
+                return
+            self.save_database()
+    
+    def request_compaction(self):
+        """Compact in the background without blocking the caller"""
+        if self.compaction_thread is None:
+            self.compaction_thread = threading.Thread(target=self.compaction_loop, name="randommer-compaction", daemon=True)
+            self.compaction_thread.start()
+        self.compaction_event.set()
+    
+    def stop_compaction(self):
+        """Wait for a background compaction in progress and stop the compaction thread"""
+        if self.compaction_thread is not None:
+            self.compaction_stopping = True
+            self.compaction_event.set()
+            self.compaction_thread.join()
+            self.compaction_thread = None
+    
     def process_request(self):
-        """Process a single request - used for threading"""
-        data = self.make_request()
+        """Process a single request - used for threading
+        
+        Returns (result, outcome, latency) where result is (brand, model, imei) or None
+        """
+        started = time.monotonic()
+        data, outcome = self.make_request()
+        latency = time.monotonic() - started
         if data:
             brand = data.get("brand", "Unknown")
             model = data.get("model", "Unknown")
             imei = data.get("imei", "")
-            return brand, model, imei
-        return None
+            return (brand, model, imei), outcome, latency
+        return None, outcome, latency
     
-    def get_stats(self):
-        """Get current database statistics"""
+    def recount_stats(self):
+        """Count brands, models and TACs by walking the whole database"""
         total_brands = len(self.database["brands"])
         total_models = 0
         total_tacs = 0
@@ -238,14 +498,74 @@ class RandommerScraper:
                 for model_data in model_entry.values():
                     total_tacs += len(model_data["tacs"])
         
-        return total_brands, total_models, total_tacs
+        self.total_brands = total_brands
+        self.total_models = total_models
+        self.total_tacs = total_tacs
+        self.brand_tac_counts = defaultdict(int, {
+            brand_name: sum(len(model_data["tacs"]) for model_entry in brand_data["models"] for model_data in model_entry.values())
+            for brand_name, brand_data in self.database["brands"].items()
+        })
+    
+    def record_discovery(self, brand, known_tacs, was_new):
+        """Record one valid sample for the discovery rate and coverage estimates. The caller must hold database_lock."""
+        self.discoveries.append(was_new)
+        for key, known in ((brand, known_tacs[0]), (None, known_tacs[1])):
+            sums = self.recaptures[key]
+            sums[0] += 1
+            sums[1] += known
+            if not was_new:
+                sums[2] += 1
+    
+    def discovery_rate(self):
+        """Share of the latest valid responses that were new TACs, or None before any"""
+        if not self.discoveries:
+            return None
+        return sum(self.discoveries) / len(self.discoveries)
+    
+    def estimate_coverage(self, brand=None):
+        """Estimate the share of a brand's TACs (or all TACs) already in the database
+        
+        Each response is treated as a random capture; TACs already in the database are
+        marked. The Schnabel estimate of the population is sum(marked at each sample)
+        / (recaptures + 1). Returns None until there is something to estimate from.
+        """
+        sums = self.recaptures.get(brand)
+        if not sums or not sums[1]:
+            return None
+        known = self.total_tacs if brand is None else self.brand_tac_counts.get(brand, 0)
+        population = sums[1] / (sums[2] + 1)
+        return min(1.0, known / population) if population else None
+    
+    def is_saturated(self):
+        """Check whether a full window of responses is yielding fewer new TACs than min_yield"""
+        if len(self.discoveries) < self.discoveries.maxlen:
+            return False
+        return self.discovery_rate() < self.min_yield
+    
+    def get_stats(self):
+        """Get current database statistics - kept up to date by add_to_database"""
+        return self.total_brands, self.total_models, self.total_tacs
+    
+    def format_status(self):
+        brands, models, tacs = self.get_stats()
+        return (f"{Fore.MAGENTA}📊 Live Stats: {Fore.CYAN}Requests: {self.current_request_count} | {Fore.GREEN}New: {self.current_new_additions} | "
+                f"{Fore.CYAN}Brands: {brands} | Models: {models} | TACs: {tacs} | "
+                f"{Fore.YELLOW}Concurrency: {self.concurrency.current_limit()} | Latency: {self.concurrency.average_latency() * 1000:.0f}ms | "
+                f"{Fore.GREEN}Yield: {self.format_percentage(self.discovery_rate())} | Coverage: {self.format_percentage(self.estimate_coverage())}{Style.RESET_ALL}")
     
-    def update_status_line(self, request_count, new_additions):
-        """Update the persistent status line at the bottom"""
+    def format_percentage(self, value):
+        return "-" if value is None else f"{value * 100:.1f}%"
+    
+    def update_status_line(self, request_count, new_additions, force=False):
+        """Update the persistent status line at the bottom, at most every STATUS_UPDATE_INTERVAL seconds"""
         self.current_request_count = request_count
         self.current_new_additions = new_additions
-        brands, models, tacs = self.get_stats()
-        status = f"{Fore.MAGENTA}📊 Live Stats: {Fore.CYAN}Requests: {request_count} | {Fore.GREEN}New: {new_additions} | {Fore.CYAN}Brands: {brands} | Models: {models} | TACs: {tacs}{Style.RESET_ALL}"
+        
+        now = time.monotonic()
+        if self.status_line_shown and not force and now - self.last_status_update < STATUS_UPDATE_INTERVAL:
+            return
+        self.last_status_update = now
+        status = self.format_status()
         
         if self.status_line_shown:
             # Move cursor up and clear the line, then print status
@@ -259,10 +579,9 @@ class RandommerScraper:
         if self.status_line_shown:
             # Move cursor up, clear line, print message
             print(f"\033[1A\033[2K{message}")
-            # Re-print the status line with current stats
-            brands, models, tacs = self.get_stats()
-            status = f"{Fore.MAGENTA}📊 Live Stats: {Fore.CYAN}Requests: {self.current_request_count} | {Fore.GREEN}New: {self.current_new_additions} | {Fore.CYAN}Brands: {brands} | Models: {models} | TACs: {tacs}{Style.RESET_ALL}"
-            print(status)
+            # Re-print the status line below it, since the message replaced it
+            print(self.format_status())
+            self.last_status_update = time.monotonic()
         else:
             print(message)
             # If this is the first message and no status line yet, show status line after
@@ -277,57 +596,127 @@ class RandommerScraper:
         print("-" * 50)
         
         request_count = 0
-        save_interval = 25
-        max_workers = 3
         new_additions = 0
+        in_flight = set()
+        stopping = False
         
         # Initialize status line
         self.update_status_line(request_count, new_additions)
         
         try:
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                while True:
-                    futures = [executor.submit(self.process_request) for _ in range(max_workers)]
+            with ThreadPoolExecutor(max_workers=self.concurrency.maximum) as executor:
+                # Once saturated in "stop" mode, in-flight requests finish as the executor shuts down
+                while not stopping:
+                    # Keep the pipeline topped up to the current limit instead of waiting for a whole batch
+                    pause = self.concurrency.pause_remaining()
+                    while not pause and len(in_flight) < self.concurrency.current_limit():
+                        in_flight.add(executor.submit(self.process_request))
+                    
+                    if not in_flight:
+                        time.sleep(pause)
+                        continue
                     
-                    for future in futures:
+                    done, in_flight = wait(in_flight, timeout=pause or None, return_when=FIRST_COMPLETED)
+                    
+                    for future in done:
                         try:
-                            result = future.result(timeout=30)
-                            if result:
-                                brand, model, imei = result
-                                request_count += 1
-                                
-                                # Don't print regular request info, just log important events
-                                
-                                was_new = self.add_to_database(brand, model, imei)
-                                if was_new:
-                                    new_additions += 1
-                                
-                                # Update status line with current stats
-                                self.update_status_line(request_count, new_additions)
-                                
-                                # Auto-save periodically
-                                if new_additions > 0 and new_additions % save_interval == 0:
-                                    self.save_database()
-                            else:
-                                self.log_message(f"{Fore.RED}❌ Failed to get data from one request...{Style.RESET_ALL}")
-                                self.update_status_line(request_count, new_additions)
-                                
+                            result, outcome, latency = future.result()
                         except Exception as e:
                             self.log_message(f"{Fore.RED}❌ Request failed: {e}{Style.RESET_ALL}")
                             self.update_status_line(request_count, new_additions)
+                            continue
+                        
+                        self.concurrency.record_latency(latency)
+                        if outcome == 'ok':
+                            self.concurrency.on_success()
+                        elif outcome in ('forbidden', 'throttled', 'timeout'):
+                            self.concurrency.on_backoff()
+                        
+                        if result:
+                            brand, model, imei = result
+                            request_count += 1
+                            
+                            # Don't print regular request info, just log important events
+                            
+                            was_new = self.add_to_database(brand, model, imei)
+                            if was_new:
+                                new_additions += 1
+                            
+                            # Update status line with current stats
+                            self.update_status_line(request_count, new_additions)
+                            
+                            # Fold the journal into the JSON snapshot periodically
+                            if was_new and new_additions % COMPACTION_INTERVAL == 0:
+                                self.request_compaction()
+                            
+                            if not stopping and self.check_saturation():
+                                stopping = True
+                        else:
+                            self.log_message(f"{Fore.RED}❌ Failed to get data from one request...{Style.RESET_ALL}")
+                            self.update_status_line(request_count, new_additions)
                 
         except KeyboardInterrupt:
-            print(f"\n{Fore.YELLOW}⏹️  Stopping scraper...{Style.RESET_ALL}")
-            self.save_database()
-            brands, models, tacs = self.get_stats()
-            print(f"\n{Fore.MAGENTA}📈 Final stats:{Style.RESET_ALL}")
-            print(f"{Fore.CYAN}Total requests made: {request_count}{Style.RESET_ALL}")
-            print(f"{Fore.GREEN}New additions: {new_additions}{Style.RESET_ALL}")
-            print(f"{Fore.CYAN}Brands: {brands}{Style.RESET_ALL}")
-            print(f"{Fore.CYAN}Models: {models}{Style.RESET_ALL}")
-            print(f"{Fore.CYAN}TACs: {tacs}{Style.RESET_ALL}")
-            print(f"{Fore.GREEN}Database saved to: {self.database_path}{Style.RESET_ALL}")
+            pass
+        
+        self.finish(request_count, new_additions)
+    
+    def check_saturation(self):
+        """Stop or slow down once new TACs dry up; returns True when the scraper should stop"""
+        saturated = self.is_saturated()
+        if saturated and self.saturation_action == "stop":
+            self.log_message(f"{Fore.YELLOW}🛑 Only {self.format_percentage(self.discovery_rate())} of the last "
+                             f"{len(self.discoveries)} responses were new TACs (minimum {self.format_percentage(self.min_yield)}), stopping{Style.RESET_ALL}")
+            return True
+        
+        if saturated:
+            if not self.slowed_down:
+                self.slowed_down = True
+                self.concurrency.maximum = MIN_CONCURRENCY
+                self.concurrency.limit = float(MIN_CONCURRENCY)
+                self.log_message(f"{Fore.YELLOW}🐢 Discovery rate below {self.format_percentage(self.min_yield)}, "
+                                 f"slowing down to one request every {SATURATION_DELAY}s{Style.RESET_ALL}")
+            self.concurrency.pause(SATURATION_DELAY)
+        elif self.slowed_down:
+            self.slowed_down = False
+            self.concurrency.maximum = MAX_CONCURRENCY
+            self.log_message(f"{Fore.GREEN}🐇 Discovery rate recovered, speeding up again{Style.RESET_ALL}")
+        return False
+    
+    def finish(self, request_count, new_additions):
+        """Save the database and print the final stats"""
+        self.update_status_line(request_count, new_additions, force=True)
+        print(f"\n{Fore.YELLOW}⏹️  Stopping scraper...{Style.RESET_ALL}")
+        self.stop_compaction()
+        self.save_database()
+        brands, models, tacs = self.get_stats()
+        print(f"\n{Fore.MAGENTA}📈 Final stats:{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Total requests made: {request_count}{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}New additions: {new_additions}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Brands: {brands}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Models: {models}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}TACs: {tacs}{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Discovery rate: {self.format_percentage(self.discovery_rate())} | "
+              f"Estimated coverage: {self.format_percentage(self.estimate_coverage())}{Style.RESET_ALL}")
+        # Coverage of the most sampled brands
+        sampled_brands = sorted(
+            (brand for brand in self.recaptures if brand is not None),
+            key=lambda brand: self.recaptures[brand][0], reverse=True
+        )
+        for brand in sampled_brands[:10]:
+            print(f"{Fore.CYAN}   {brand}: {self.brand_tac_counts.get(brand, 0)} TACs, "
+                  f"estimated coverage {self.format_percentage(self.estimate_coverage(brand))}{Style.RESET_ALL}")
+        print(f"{Fore.GREEN}Database saved to: {self.database_path}{Style.RESET_ALL}")
 
 if __name__ == "__main__":
-    scraper = RandommerScraper()
+    parser = argparse.ArgumentParser(description="Scrape device TACs from randommer.io into randommer.json")
+    parser.add_argument("--min-yield", type=float, default=DEFAULT_MIN_YIELD,
+                        help=f"Minimum share of new TACs over the discovery window before saturating (default: {DEFAULT_MIN_YIELD})")
+    parser.add_argument("--on-saturation", choices=SATURATION_ACTIONS, default="stop",
+                        help="Stop, or slow down to one request at a time, once saturated (default: stop)")
+    parser.add_argument("--window", type=int, default=DISCOVERY_WINDOW,
+                        help=f"Number of recent responses the discovery rate is measured over (default: {DISCOVERY_WINDOW})")
+    args = parser.parse_args()
+    
+    scraper = RandommerScraper(min_yield=args.min_yield, saturation_action=args.on_saturation,
+                               discovery_window=args.window)
     scraper.run()
@@ -2,9 +2,20 @@ import csv
 import json
 import os
 import glob
+import argparse
+import hashlib
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 
+REQUIRED_COLUMNS = ('Brand', 'Optus Model Name', 'Telstra Model Name', 'TAC')
+
+MANIFEST_FILENAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Advance progress bars in steps of this many bytes rather than on every line
+PROGRESS_UPDATE_BYTES = 64 * 1024
+
 def load_existing_json(json_file_path):
     if os.path.exists(json_file_path):
         try:
@@ -78,13 +89,294 @@ def format_brand_name(brand):
     
     return brand.capitalize()
 
-def process_csv_to_json(csv_files, json_file_path):
-    final_data = load_existing_json(json_file_path)
-    brands_data = defaultdict(lambda: defaultdict(lambda: {
+def new_brands_data():
+    return defaultdict(lambda: defaultdict(lambda: {
         'tacs': set(), 
         'alt_names': set(),
         'image': ""
     }))
+
+def read_lines(binary_file, pbar, update_bytes=PROGRESS_UPDATE_BYTES):
+    """Yield decoded lines from a binary file, advancing pbar by the bytes consumed."""
+    pending = 0
+    for line in binary_file:
+        pending += len(line)
+        if pending >= update_bytes:
+            pbar.update(pending)
+            pending = 0
+        yield line.decode('utf-8')
+    pbar.update(pending)
+
+def process_csv_file(csv_file_path, show_progress=True):
+    """
+    Parse one CSV file into partial brands data
+    
+    Args:
+        csv_file_path (str): Path to the CSV file
+        show_progress (bool): Whether to show a progress bar
+        
+    Returns:
+        tuple: (brands, total_rows, processed_rows), where brands maps
+        brand -> model -> {'tacs', 'alt_names', 'image'} in first-seen order
+    """
+    brands_data = new_brands_data()
+    total_rows = 0
+    processed_rows = 0
+    
+    file_size = os.path.getsize(csv_file_path)
+    
+    with open(csv_file_path, 'rb') as csvfile, \
+            tqdm(total=file_size, unit='B', unit_scale=True,
+                 desc=f"   Processing {os.path.basename(csv_file_path)}", disable=not show_progress) as pbar:
+        reader = csv.reader(read_lines(csvfile, pbar))
+        header = next(reader, [])
+        columns = {name: index for index, name in enumerate(header)}
+        missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+        if missing:
+            raise ValueError(f"{csv_file_path} is missing columns: {', '.join(missing)}")
+        
+        brand_col = columns['Brand']
+        optus_col = columns['Optus Model Name']
+        telstra_col = columns['Telstra Model Name']
+        model_info_col = columns.get('Model Info')
+        tac_col = columns['TAC']
+        
+        for row in reader:
+            if not row:
+                # Blank lines are not rows, as with DictReader
+                continue
+            total_rows += 1
+            
+            width = len(row)
+            brand_raw = row[brand_col].strip() if brand_col < width else ''
+            optus_model = row[optus_col].strip() if optus_col < width else ''
+            telstra_model = row[telstra_col].strip() if telstra_col < width else ''
+            model_info = row[model_info_col].strip() if model_info_col is not None and model_info_col < width else ''
+            tac = row[tac_col].strip() if tac_col < width else ''
+            
+            if not brand_raw or not optus_model or not tac:
+                continue
+            
+            brand = format_brand_name(brand_raw)
+            
+            if model_info:
+                raw_model_name = model_info
+            else:
+                raw_model_name = optus_model.title()
+            
+            model_name = clean_model_name(raw_model_name, brand)
+            
+            if len(tac) == 8 and tac.isdigit():
+                brands_data[brand][model_name]['tacs'].add(tac)
+            
+            if telstra_model and telstra_model != "N/A":
+                cleaned_telstra = clean_model_name(telstra_model, brand)
+                if cleaned_telstra and cleaned_telstra != model_name:
+                    brands_data[brand][model_name]['alt_names'].add(cleaned_telstra)
+            
+            if model_info and optus_model:
+                cleaned_optus = clean_model_name(optus_model.title(), brand)
+                if cleaned_optus and cleaned_optus != model_name:
+                    brands_data[brand][model_name]['alt_names'].add(cleaned_optus)
+            
+            processed_rows += 1
+    
+    # Plain dicts so the result can be sent back from a worker process
+    brands = {brand: dict(models) for brand, models in brands_data.items()}
+    return brands, total_rows, processed_rows
+
+def merge_brands_data(brands_data, brands):
+    """Merge partial brands data into brands_data, keeping first-seen order."""
+    for brand, models in brands.items():
+        for model_name, model_data in models.items():
+            merged = brands_data[brand][model_name]
+            merged['tacs'].update(model_data['tacs'])
+            merged['alt_names'].update(model_data['alt_names'])
+
+def file_sha256(file_path):
+    """Hash a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def write_json_atomic(file_path, data, indent=None):
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+def load_manifest(cache_dir):
+    """
+    Load the CSV manifest from a cache directory
+    
+    The manifest records, per CSV file name, the content hash and row
+    counts of the file whose parsed results are cached next to it, plus
+    the signature and totals of the JSON file written last.
+    """
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {'version': MANIFEST_VERSION, 'files': {}, 'output': None, 'totals': None}
+
+def partial_cache_path(cache_dir, csv_name):
+    return os.path.join(cache_dir, f"{csv_name}.json")
+
+def save_partial(cache_path, brands):
+    """Cache one file's parsed brands data, keeping brand and model order."""
+    write_json_atomic(cache_path, {
+        brand: {
+            model_name: {
+                'tacs': sorted(model_data['tacs']),
+                'alt_names': sorted(model_data['alt_names'])
+            }
+            for model_name, model_data in models.items()
+        }
+        for brand, models in brands.items()
+    })
+
+def load_partial(cache_path):
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def partial_tacs(brands):
+    """Return every TAC in partial brands data"""
+    tacs = set()
+    for models in brands.values():
+        for model_data in models.values():
+            tacs.update(model_data['tacs'])
+    return tacs
+
+def parse_csv_files(csv_files, workers):
+    """Parse CSV files, yielding (path, result) in csv_files order"""
+    total_files = len(csv_files)
+    workers = min(workers or os.cpu_count() or 1, total_files) or 1
+    
+    if workers > 1:
+        print(f"⚙️  Parsing with {workers} worker processes")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in submission order, which keeps the merge deterministic
+            results = executor.map(process_csv_file, csv_files, [False] * total_files)
+            for csv_file_path, result in tqdm(zip(csv_files, results), total=total_files, desc="Processing files"):
+                tqdm.write(f"   ✅ Processed {result[2]} rows from {os.path.basename(csv_file_path)}")
+                yield csv_file_path, result
+    else:
+        for file_idx, csv_file_path in enumerate(csv_files, 1):
+            print(f"\n📄 Processing file {file_idx}/{total_files}: {os.path.basename(csv_file_path)}")
+            result = process_csv_file(csv_file_path)
+            print(f"   ✅ Processed {result[2]} rows from {os.path.basename(csv_file_path)}")
+            yield csv_file_path, result
+
+def process_csv_to_json(csv_files, json_file_path, workers=None, cache_dir=None, full=False):
+    """
+    Process CSV files into the brands JSON database
+    
+    Files are parsed in a process pool when workers allows more than one
+    process. Partial results are always merged in csv_files order, so the
+    output is identical to processing the files one after another.
+    
+    With a cache_dir, each file's parsed result is cached alongside a
+    manifest of content hashes, and only files whose contents changed are
+    parsed again. If no file changed and the JSON file is the one written
+    last time, nothing is rewritten at all.
+    
+    Args:
+        csv_files (list): Paths of the CSV files to process
+        json_file_path (str): Path of the JSON database to update
+        workers (int): Number of worker processes (default: one per CPU)
+        cache_dir (str): Directory for the manifest and cached results
+        full (bool): Parse every file even if its cached result is current
+        
+    Returns:
+        tuple: (total_brands, total_models, total_tacs)
+    """
+    total_files = len(csv_files)
+    results = [None] * total_files
+    manifest = None
+    
+    print(f"📁 Found {total_files} CSV files to process")
+    
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        manifest = load_manifest(cache_dir)
+        csv_names = [os.path.basename(csv_file_path) for csv_file_path in csv_files]
+        hashes = {}
+        
+        for file_idx, csv_file_path in enumerate(csv_files):
+            csv_name = csv_names[file_idx]
+            hashes[csv_name] = file_sha256(csv_file_path)
+            entry = manifest['files'].get(csv_name)
+            if full or not entry or entry['sha256'] != hashes[csv_name]:
+                continue
+            try:
+                brands = load_partial(partial_cache_path(cache_dir, csv_name))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+            results[file_idx] = (brands, entry['total_rows'], entry['processed_rows'])
+        
+        removed_names = sorted(set(manifest['files']) - set(csv_names))
+        changed = [csv_files[file_idx] for file_idx in range(total_files) if results[file_idx] is None]
+        print(f"🗂️  {total_files - len(changed)} unchanged, {len(changed)} changed, {len(removed_names)} removed")
+        
+        if (not changed and not removed_names and manifest['totals'] is not None and
+                manifest['output'] == file_signature(json_file_path)):
+            print(f"✅ {json_file_path} is already up to date")
+            return tuple(manifest['totals'])
+    else:
+        changed = list(csv_files)
+    
+    for csv_file_path, result in parse_csv_files(changed, workers):
+        results[csv_files.index(csv_file_path)] = result
+        if manifest is None:
+            continue
+        
+        csv_name = os.path.basename(csv_file_path)
+        cache_path = partial_cache_path(cache_dir, csv_name)
+        previous_tacs = set()
+        if csv_name in manifest['files']:
+            try:
+                previous_tacs = partial_tacs(load_partial(cache_path))
+            except (FileNotFoundError, json.JSONDecodeError):
+                pass
+        current_tacs = partial_tacs(result[0])
+        print(f"   🔁 {csv_name}: +{len(current_tacs - previous_tacs):,} TACs, "
+              f"-{len(previous_tacs - current_tacs):,} TACs")
+        
+        save_partial(cache_path, result[0])
+        manifest['files'][csv_name] = {
+            'sha256': hashes[csv_name],
+            'total_rows': result[1],
+            'processed_rows': result[2]
+        }
+    
+    if manifest is not None:
+        for csv_name in removed_names:
+            cache_path = partial_cache_path(cache_dir, csv_name)
+            try:
+                removed_tacs = partial_tacs(load_partial(cache_path))
+                os.remove(cache_path)
+            except (FileNotFoundError, json.JSONDecodeError):
+                removed_tacs = set()
+            # Already-published TACs stay in the JSON, which is merged into on every run
+            print(f"   🗑️  {csv_name} was removed: -{len(removed_tacs):,} TACs no longer backed by a CSV")
+            del manifest['files'][csv_name]
+    
+    final_data = load_existing_json(json_file_path)
+    brands_data = new_brands_data()
     
     for brand_name, brand_data in final_data.get("brands", {}).items():
         for model_entry in brand_data.get("models", []):
@@ -93,66 +385,12 @@ def process_csv_to_json(csv_files, json_file_path):
                 brands_data[brand_name][model_name]['alt_names'].update(model_info.get('alt_names', []))
                 brands_data[brand_name][model_name]['image'] = model_info.get('image', "")
     
-    total_files = len(csv_files)
     grand_total_rows = 0
     grand_processed_rows = 0
-    
-    print(f"📁 Found {total_files} CSV files to process")
-    
-    for file_idx, csv_file_path in enumerate(csv_files, 1):
-        print(f"\n📄 Processing file {file_idx}/{total_files}: {os.path.basename(csv_file_path)}")
-        total_rows = 0
-        processed_rows = 0
-        print("   Counting rows...")
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            total_rows = sum(1 for row in reader)
-        
+    for brands, total_rows, processed_rows in results:
+        merge_brands_data(brands_data, brands)
         grand_total_rows += total_rows
-        print(f"   Found {total_rows} rows to process...")
-        
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            
-            with tqdm(total=total_rows, desc=f"   Processing {os.path.basename(csv_file_path)}") as pbar:
-                for row in reader:
-                    brand_raw = row['Brand'].strip()
-                    optus_model = row['Optus Model Name'].strip()
-                    telstra_model = row['Telstra Model Name'].strip()
-                    model_info = row.get('Model Info', '').strip()
-                    tac = row['TAC'].strip()
-                    
-                    if not brand_raw or not optus_model or not tac:
-                        pbar.update(1)
-                        continue
-                    
-                    brand = format_brand_name(brand_raw)
-                    
-                    if model_info:
-                        raw_model_name = model_info
-                    else:
-                        raw_model_name = optus_model.title()
-                    
-                    model_name = clean_model_name(raw_model_name, brand)
-                    
-                    if len(tac) == 8 and tac.isdigit():
-                        brands_data[brand][model_name]['tacs'].add(tac)
-                    
-                    if telstra_model and telstra_model != "N/A":
-                        cleaned_telstra = clean_model_name(telstra_model, brand)
-                        if cleaned_telstra and cleaned_telstra != model_name:
-                            brands_data[brand][model_name]['alt_names'].add(cleaned_telstra)
-                    
-                    if model_info and optus_model:
-                        cleaned_optus = clean_model_name(optus_model.title(), brand)
-                        if cleaned_optus and cleaned_optus != model_name:
-                            brands_data[brand][model_name]['alt_names'].add(cleaned_optus)
-                    
-                    processed_rows += 1
-                    pbar.update(1)
-        
         grand_processed_rows += processed_rows
-        print(f"   ✅ Processed {processed_rows} rows from {os.path.basename(csv_file_path)}")
     
     final_data = {"brands": {}}
     
@@ -181,8 +419,13 @@ def process_csv_to_json(csv_files, json_file_path):
                 final_data["brands"][brand]["models"].append(model_entry)
     
     print(f"\n💾 Writing data to {json_file_path}...")
-    with open(json_file_path, 'w', encoding='utf-8') as jsonfile:
-        json.dump(final_data, jsonfile, indent=4, ensure_ascii=False)
+    # Readers (the lookup service reloads on change) never see a half-written file
+    write_json_atomic(json_file_path, final_data, indent=4)
+    
+    if manifest is not None:
+        manifest['output'] = file_signature(json_file_path)
+        manifest['totals'] = [total_brands, total_models, total_tacs]
+        write_json_atomic(os.path.join(cache_dir, MANIFEST_FILENAME), manifest, indent=4)
     
     print("\n" + "="*60)
     print("🎉 PROCESSING COMPLETE!")
@@ -199,11 +442,19 @@ def process_csv_to_json(csv_files, json_file_path):
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Build isthisphoneblocked.json from the raw CSV exports")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for parsing CSV files (default: one per CPU, 1 to disable)")
+    parser.add_argument('--full', action='store_true',
+                        help="Parse every CSV file again instead of reusing cached results for unchanged files")
+    args = parser.parse_args()
+    
     script_dir = os.path.dirname(os.path.abspath(__file__))
     raw_data_dir = script_dir
     json_file = os.path.join(os.path.dirname(script_dir), "isthisphoneblocked.json")
+    cache_dir = os.path.join(raw_data_dir, ".cache")
     csv_pattern = os.path.join(raw_data_dir, "*.csv")
-    csv_files = glob.glob(csv_pattern)
+    csv_files = sorted(glob.glob(csv_pattern))
     
     if not csv_files:
         print(f"❌ Error: No CSV files found in {raw_data_dir}")
@@ -218,7 +469,8 @@ def main():
     print()
     
     try:
-        brands, models, tacs = process_csv_to_json(csv_files, json_file)
+        brands, models, tacs = process_csv_to_json(csv_files, json_file, workers=args.workers,
+                                                    cache_dir=cache_dir, full=args.full)
         
         if os.path.exists(json_file):
             file_size = os.path.getsize(json_file)
@@ -0,0 +1,20 @@
+# Loaded automatically when gunicorn is started from this directory.
+# Only server hooks and the metrics directory live here; bind address and worker
+# count stay on the command line.
+
+import os
+
+# Workers share metrics through files in this directory (see metrics.py). It
+# must be set before metrics is imported anywhere, including in the workers.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', 'databases/metrics')
+
+
+def on_starting(server):
+    """Start every run with empty multiprocess metrics."""
+    from metrics import clear_metrics_dir
+    clear_metrics_dir()
+
+
+def child_exit(server, worker):
+    from metrics import mark_worker_dead
+    mark_worker_dead(worker.pid)
@@ -0,0 +1,383 @@
+"""
+Append-only lookup log storage shared by the public app and the admin panel.
+
+Lookups are stored as JSON lines in numbered segment files inside a log
+directory. Writers append whole batches under an exclusive file lock, so
+several gunicorn workers can log at the same time without losing entries.
+Segments rotate once they reach a size limit and the oldest segments are
+deleted to keep the log within its retention budget.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.jsonl'
+STATS_FILENAME = 'stats.json'
+LOCK_FILENAME = '.lock'
+
+DEFAULT_MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_SEGMENTS = 32
+
+
+def empty_stats():
+    return {
+        "total_lookups": 0,
+        "first_lookup": None,
+        "last_lookup": None
+    }
+
+
+class LookupLogStore:
+    def __init__(self, log_dir, max_segment_bytes=DEFAULT_MAX_SEGMENT_BYTES,
+                 max_segments=DEFAULT_MAX_SEGMENTS, legacy_json_path=None):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.stats_path = os.path.join(log_dir, STATS_FILENAME)
+        self.lock_path = os.path.join(log_dir, LOCK_FILENAME)
+        os.makedirs(log_dir, exist_ok=True)
+        if legacy_json_path:
+            self.migrate_legacy_json(legacy_json_path)
+
+    @contextmanager
+    def locked(self):
+        """Hold the store's exclusive lock, shared across processes."""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def segment_path(self, number):
+        return os.path.join(self.log_dir, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def list_segments(self):
+        """Return the segment numbers currently on disk, oldest first."""
+        numbers = []
+        for filename in os.listdir(self.log_dir):
+            if filename.startswith(SEGMENT_PREFIX) and filename.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(filename[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    def read_stats(self):
+        """Read the running lookup statistics."""
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return empty_stats()
+
+    def write_stats(self, stats):
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False)
+        os.replace(tmp_path, self.stats_path)
+
+    def append(self, entries):
+        """Append a batch of lookup entries and return the updated stats."""
+        if not entries:
+            return self.read_stats()
+
+        payload = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+
+        with self.locked():
+            segments = self.list_segments()
+            number = segments[-1] if segments else 1
+            path = self.segment_path(number)
+
+            try:
+                current_size = os.path.getsize(path)
+            except FileNotFoundError:
+                current_size = 0
+
+            if current_size and current_size + len(payload) > self.max_segment_bytes:
+                number += 1
+                path = self.segment_path(number)
+                segments.append(number)
+            elif not segments:
+                segments.append(number)
+
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, payload)
+            finally:
+                os.close(fd)
+
+            while len(segments) > self.max_segments:
+                oldest = segments.pop(0)
+                try:
+                    os.remove(self.segment_path(oldest))
+                except FileNotFoundError:
+                    pass
+
+            stats = self.read_stats()
+            stats["total_lookups"] += len(entries)
+            stats["last_lookup"] = entries[-1].get("timestamp")
+            if stats["first_lookup"] is None:
+                stats["first_lookup"] = entries[0].get("timestamp")
+            self.write_stats(stats)
+
+        return stats
+
+    def read_segment(self, number):
+        """Read all complete entries from one segment."""
+        entries = []
+        try:
+            with open(self.segment_path(number), 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        # A writer is still appending this line
+                        break
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logger.warning(f"Skipping malformed lookup log line in segment {number}")
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def iter_entries(self):
+        """Yield every retained lookup entry, oldest first."""
+        for number in self.list_segments():
+            yield from self.read_segment(number)
+
+    def load(self):
+        """Load the log in the same shape as the old lookup_log.json."""
+        return {
+            "lookups": list(self.iter_entries()),
+            "stats": self.read_stats()
+        }
+
+    def read_segment_from(self, number, offset=0):
+        """Read complete entries appended to a segment at or after a byte offset.
+
+        Returns (inode, [(offset, entry), ...], end_offset); inode is None if
+        the segment no longer exists. A trailing line that is still being
+        written is left for the next read.
+        """
+        try:
+            with open(self.segment_path(number), 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return None, [], offset
+
+        entries = []
+        position = 0
+        while True:
+            end = data.find(b'\n', position)
+            if end == -1:
+                break
+            line = data[position:end]
+            try:
+                entries.append((offset + position, json.loads(line)))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed lookup log line in segment {number}")
+            position = end + 1
+
+        return inode, entries, offset + position
+
+    def remove_tacs(self, tacs):
+        """Remove every entry for the given TACs and return how many were removed."""
+        with self.locked():
+            return self.rewrite_without_tacs(tacs)
+
+    def rewrite_without_tacs(self, tacs):
+        """Rewrite the segments that contain the given TACs. The caller must hold locked()."""
+        tacs = set(tacs)
+        removed_count = 0
+
+        for number in self.list_segments():
+            entries = self.read_segment(number)
+            kept = [entry for entry in entries if entry.get('tac') not in tacs]
+            if len(kept) == len(entries):
+                continue
+
+            removed_count += len(entries) - len(kept)
+            path = self.segment_path(number)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in kept:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            os.replace(tmp_path, path)
+
+        return removed_count
+
+    def migrate_legacy_json(self, json_path):
+        """Import lookups from the old single-file JSON log into an empty store."""
+        if os.path.exists(self.stats_path) or not os.path.exists(json_path):
+            return
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading legacy lookup log {json_path}: {e}")
+            return
+
+        with self.locked():
+            if os.path.exists(self.stats_path):
+                return
+
+            lookups = data.get("lookups", [])
+            if lookups:
+                with open(self.segment_path(1), 'w', encoding='utf-8') as f:
+                    for entry in lookups:
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+            stats = empty_stats()
+            stats.update(data.get("stats", {}))
+            self.write_stats(stats)
+            logger.info(f"Migrated {len(lookups):,} lookups from {json_path} to {self.log_dir}")
+
+
+class LogTail:
+    """Follow a LookupLogStore, returning only the entries appended since the last read."""
+
+    def __init__(self, store):
+        self.store = store
+        # segment number -> (inode, byte offset read up to)
+        self.positions = {}
+
+    def read_new(self):
+        """Return (reset, entries) with entries as (segment, offset, entry) tuples.
+
+        reset is True when segments were deleted by retention or rewritten by
+        someone else since the last read; entries then hold the whole log and
+        anything derived from earlier reads should be discarded.
+        """
+        segments = self.store.list_segments()
+        reset = False
+        for number, (inode, offset) in self.positions.items():
+            if number not in segments:
+                reset = True
+                break
+            try:
+                stat = os.stat(self.store.segment_path(number))
+            except FileNotFoundError:
+                reset = True
+                break
+            if stat.st_ino != inode or stat.st_size < offset:
+                reset = True
+                break
+
+        if reset:
+            self.positions = {}
+
+        entries = []
+        for number in segments:
+            inode, offset = self.positions.get(number, (None, 0))
+            current_inode, segment_entries, end_offset = self.store.read_segment_from(number, offset)
+            if current_inode is None:
+                continue
+            if inode is not None and current_inode != inode:
+                # Replaced between the checks above and this read; start over next time
+                self.positions = {}
+                return self.read_new()
+            self.positions[number] = (current_inode, end_offset)
+            entries.extend((number, entry_offset, entry) for entry_offset, entry in segment_entries)
+
+        return reset, entries
+
+    def sync(self):
+        """Treat everything currently on disk as read.
+
+        Only safe while holding the store lock, right after applying a change
+        to the log (such as rewrite_without_tacs) to your derived state yourself.
+        """
+        self.positions = {}
+        for number in self.store.list_segments():
+            try:
+                stat = os.stat(self.store.segment_path(number))
+            except FileNotFoundError:
+                continue
+            self.positions[number] = (stat.st_ino, stat.st_size)
+
+
+class LookupLogIndex:
+    """Secondary index of lookup log entries by TAC and IMEI.
+
+    Positions are tracked per segment, so appended lines are indexed
+    incrementally and a segment that was rewritten or deleted only has its
+    own positions rebuilt or dropped. Queries read just the matching lines.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        # segment number -> {'inode', 'offset', 'tacs': {tac: [offsets]}, 'imeis': {imei: [offsets]}}
+        self.segments = {}
+
+    def refresh(self):
+        """Index lines appended since the last refresh."""
+        with self.lock:
+            numbers = self.store.list_segments()
+            for number in list(self.segments):
+                if number not in numbers:
+                    del self.segments[number]
+
+            for number in numbers:
+                segment = self.segments.get(number)
+                offset = segment['offset'] if segment else 0
+                inode, entries, end_offset = self.store.read_segment_from(number, offset)
+                if inode is None:
+                    self.segments.pop(number, None)
+                    continue
+                if segment is None or segment['inode'] != inode:
+                    if segment is not None:
+                        # Rewritten since it was indexed, so index it again from the start
+                        inode, entries, end_offset = self.store.read_segment_from(number, 0)
+                    segment = self.segments[number] = {'inode': inode, 'offset': 0, 'tacs': {}, 'imeis': {}}
+
+                for entry_offset, entry in entries:
+                    if entry.get('tac'):
+                        segment['tacs'].setdefault(entry['tac'], []).append(entry_offset)
+                    if entry.get('imei'):
+                        segment['imeis'].setdefault(entry['imei'], []).append(entry_offset)
+                segment['offset'] = end_offset
+
+    def read_positions(self, field, value):
+        """Read the indexed entries for a value, or return None if a segment changed underneath."""
+        with self.lock:
+            positions = [
+                (number, segment['inode'], segment[field + 's'].get(value, []))
+                for number, segment in sorted(self.segments.items())
+            ]
+
+        entries = []
+        for number, inode, offsets in positions:
+            if not offsets:
+                continue
+            try:
+                with open(self.store.segment_path(number), 'rb') as f:
+                    if os.fstat(f.fileno()).st_ino != inode:
+                        return None
+                    for offset in offsets:
+                        f.seek(offset)
+                        entries.append(json.loads(f.readline()))
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+        return entries
+
+    def find(self, tac=None, imei=None):
+        """Return the log entries for a TAC or an IMEI, oldest first."""
+        field, value = ('tac', tac) if tac is not None else ('imei', imei)
+        self.refresh()
+        entries = self.read_positions(field, value)
+        if entries is None:
+            # A segment was rewritten or deleted between indexing and reading
+            self.refresh()
+            entries = self.read_positions(field, value) or []
+        return [entry for entry in entries if entry.get(field) == value]
@@ -0,0 +1,99 @@
+"""
+Prometheus metrics for the lookup service.
+
+When PROMETHEUS_MULTIPROC_DIR is set, metrics use prometheus_client's
+multiprocess mode: every gunicorn worker writes its samples to files in
+METRICS_DIR, and /metrics adds them up, so a scrape reports the whole service
+no matter which worker answers it. gunicorn.conf.py sets the variable, empties
+the directory when the server starts and tells prometheus_client when a worker
+exits. Without it (python app.py, admin tools) metrics stay in the default
+in-process registry and nothing is written to disk.
+"""
+
+import os
+import shutil
+
+# prometheus_client picks multiprocess mode at import time, so the variable
+# has to be set before this module is first imported
+METRICS_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None
+if METRICS_DIR:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+PROVIDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 30, 60)
+LOG_WRITE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+HTTP_REQUESTS = Counter(
+    'eyemei_http_requests_total', 'HTTP requests handled, by route',
+    ['endpoint', 'method', 'status']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'eyemei_http_request_duration_seconds', 'Time to send a response, by route, including streamed bodies',
+    ['endpoint'], buckets=REQUEST_BUCKETS
+)
+
+PROVIDER_CHECK_DURATION = Histogram(
+    'eyemei_provider_check_duration_seconds', 'Upstream provider check duration, by provider and outcome',
+    ['provider', 'outcome'], buckets=PROVIDER_BUCKETS
+)
+PROVIDER_CHECK_ERRORS = Counter(
+    'eyemei_provider_check_errors_total', 'Provider checks that failed or raised',
+    ['provider']
+)
+PROVIDER_CHECK_TIMEOUTS = Counter(
+    'eyemei_provider_check_timeouts_total', 'Provider checks still running when a lookup hit its deadline',
+    ['provider']
+)
+
+DATABASE_LOOKUPS = Counter(
+    'eyemei_database_lookups_total', 'TAC lookups per database, by whether the TAC was found',
+    ['database', 'result']
+)
+
+LOOKUP_LOG_WRITE_DURATION = Histogram(
+    'eyemei_lookup_log_write_duration_seconds', 'Time to append one batch to the lookup log',
+    buckets=LOG_WRITE_BUCKETS
+)
+LOOKUP_LOG_ENTRIES = Counter(
+    'eyemei_lookup_log_entries_total', 'Lookup log entries written'
+)
+
+PROVIDER_CACHE_REQUESTS = Counter(
+    'eyemei_provider_cache_requests_total', 'Provider result cache lookups, by provider and hit or miss',
+    ['provider', 'result']
+)
+PROVIDER_CACHE_ENTRIES = Gauge(
+    'eyemei_provider_cache_entries', 'Provider results currently cached, summed over live workers',
+    multiprocess_mode='livesum'
+)
+PROVIDER_SHARED_CALLS = Counter(
+    'eyemei_provider_shared_calls_total', 'Provider checks that joined an identical check already in flight'
+)
+
+
+def render_metrics():
+    """Return (body, content_type) with the metrics of every worker combined."""
+    if METRICS_DIR is None:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=METRICS_DIR)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def clear_metrics_dir():
+    """Remove samples left over from a previous run. Call before any worker starts."""
+    if METRICS_DIR is None:
+        return
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+
+
+def mark_worker_dead(pid):
+    """Drop a finished worker's live gauges; its counters and histograms are kept."""
+    if METRICS_DIR is None:
+        return
+    multiprocess.mark_process_dead(pid, path=METRICS_DIR)
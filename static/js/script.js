@@ -115,16 +115,23 @@ class eyeMEI {
         try {
             const databaseType = this.currentDatabaseValue;
             const country = this.currentCountryValue;
+            const requestBody = JSON.stringify({ 
+                imei: imei,
+                database_type: databaseType,
+                country: country
+            });
+
+            if (window.ReadableStream && window.TextDecoder) {
+                await this.performStreamingLookup(requestBody);
+                return;
+            }
+
             const response = await fetch('/api/lookup', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ 
-                    imei: imei,
-                    database_type: databaseType,
-                    country: country
-                })
+                body: requestBody
             });
 
             if (!response.ok) {
@@ -142,6 +149,50 @@ class eyeMEI {
         }
     }
 
+    async performStreamingLookup(requestBody) {
+        const response = await fetch('/api/lookup/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: requestBody
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.error || 'Failed to perform lookup');
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let providerChecks = [];
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const message = JSON.parse(line);
+
+                if (message.type === 'databases') {
+                    providerChecks = message.pending_providers.map(provider => ({ ...provider, pending: true }));
+                    this.displayResults({ ...message, provider_checks: providerChecks });
+                } else if (message.type === 'provider_check') {
+                    providerChecks[message.position] = message.result;
+                    this.displayProviderResults(providerChecks);
+                } else if (message.type === 'complete') {
+                    this.displayProviderResults(message.provider_checks);
+                }
+            }
+        }
+    }
+
     validateIMEI(imei) {
         return imei && /^\d{15}$/.test(imei);
     }
@@ -162,7 +213,7 @@ class eyeMEI {
     displayResults(data) {
         this.hideLoading();
         this.displayDatabaseInfo(data.eyemei_device_info, data.tac, 'eyeMEI');
-        this.displaySecondaryDatabaseInfo(data.secondary_device_info, data.tac, data.secondary_db_name);
+        this.displaySecondaryDatabaseInfo(data.secondary_device_info, data.tac, data.secondary_db_name, data.sources);
         this.displayProviderResults(data.provider_checks);
         this.resultsSection.classList.remove('hidden');
         this.resultsSection.scrollIntoView({ behavior: 'smooth' });
@@ -209,8 +260,9 @@ class eyeMEI {
         }
     }
 
-    displaySecondaryDatabaseInfo(deviceInfo, tac, dbName) {
+    displaySecondaryDatabaseInfo(deviceInfo, tac, dbName, sources) {
         const secondaryDbDetails = document.getElementById('secondary-db-details');
+        const sourcesHtml = sources ? this.getSourcesDetails(sources) : '';
         
         if (deviceInfo) {
             let imageHtml = '';
@@ -236,6 +288,7 @@ class eyeMEI {
                     <span class="info-label">TAC:</span>
                     <span class="info-value">${this.escapeHtml(tac)}</span>
                 </div>
+                ${sourcesHtml}
             `;
         } else {
             secondaryDbDetails.innerHTML = `
@@ -247,10 +300,27 @@ class eyeMEI {
                     <span class="info-label">Status:</span>
                     <span class="info-value">Not found in ${dbName}</span>
                 </div>
+                ${sourcesHtml}
             `;
         }
     }
 
+    getSourcesDetails(sources) {
+        const sourceNames = {
+            eyemei: 'eyeMEI',
+            isthisphoneblocked: 'IsThisPhoneBlocked',
+            randommer: 'Randommer',
+            osmocom: 'OsmocomTAC'
+        };
+
+        return Object.entries(sources).map(([source, deviceInfo]) => `
+            <div class="info-item">
+                <span class="info-label">${this.escapeHtml(sourceNames[source] || source)}:</span>
+                <span class="info-value">${deviceInfo ? `${this.escapeHtml(deviceInfo.brand)} ${this.escapeHtml(deviceInfo.model)}` : 'Not found'}</span>
+            </div>
+        `).join('');
+    }
+
     displayProviderResults(providerChecks) {
         const providerResults = document.getElementById('provider-results');
         
@@ -274,6 +344,7 @@ class eyeMEI {
     }
 
     getStatusClass(result) {
+        if (result.pending) return 'neutral';
         if (!result.success) return 'error';
         
         const status = result.status?.toLowerCase();
@@ -284,11 +355,13 @@ class eyeMEI {
     }
 
     getStatusText(result) {
-        if (!result.success) return 'Error';
+        if (result.pending) return 'Checking...';
+        if (!result.success) return result.timed_out ? 'Timeout' : 'Error';
         return result.status || 'Unknown';
     }
 
     getStatusBadgeClass(result) {
+        if (result.pending) return 'status-unknown';
         if (!result.success) return 'status-error';
         
         const status = result.status?.toLowerCase();
@@ -299,6 +372,10 @@ class eyeMEI {
     }
 
     getProviderDetails(result) {
+        if (result.pending) {
+            return '<small><i class="fas fa-spinner fa-spin"></i> Waiting for response...</small>';
+        }
+
         if (!result.success) {
             return `<small>Unable to check: ${this.escapeHtml(result.error || 'Service unavailable')}</small>`;
         }
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Compact binary TAC index files for the eyeMEI device databases.
+
+Running this script compiles each brands/models/tacs JSON database into a
+.tacidx file next to it:
+
+    python tac_index.py                      # all databases used by app.py
+    python tac_index.py databases/foo.json   # specific databases
+
+IMEIDatabase memory-maps an up-to-date index instead of parsing the JSON,
+so the pages are shared between gunicorn workers and startup is instant.
+An index is only used while the JSON it was built from is unchanged.
+
+File layout (little-endian, every section 4-byte aligned):
+
+    header    see HEADER below
+    tacs      tac_count x uint32, TACs as integers, sorted
+    refs      tac_count x uint32, record number of each TAC
+    records   record_count x 4 x uint32, string offsets of
+              brand, model, alt_names and image
+    strings   uint32 byte length + UTF-8 bytes per string, padded to 4 bytes
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+
+INDEX_SUFFIX = '.tacidx'
+MAGIC = b'EYETACIX'
+VERSION = 1
+
+# magic, version, tac_count, record_count, strings_size,
+# total_brands, total_models, total_tacs, reserved, source_size, source_mtime_ns
+HEADER = struct.Struct('<8sIIIIIIIIQQ')
+UINT32 = struct.Struct('<I')
+RECORD_FIELDS = 4
+
+# Separator used to store the alt_names list as a single string
+ALT_NAMES_SEPARATOR = '\x1f'
+
+DEFAULT_DATABASES = [
+    'databases/eyemei.json',
+    'databases/osmocom.json',
+    'databases/isthisphoneblocked.json',
+    'databases/randommer.json',
+]
+
+
+def default_index_path(json_path):
+    """Return the index path that belongs to a JSON database."""
+    return os.path.splitext(json_path)[0] + INDEX_SUFFIX
+
+
+def build_index(json_path, index_path=None):
+    """Compile a JSON database into a binary TAC index and return its totals."""
+    index_path = index_path or default_index_path(json_path)
+    source_stat = os.stat(json_path)
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    strings = {}
+    string_table = bytearray()
+
+    def add_string(value):
+        offset = strings.get(value)
+        if offset is None:
+            encoded = value.encode('utf-8')
+            offset = len(string_table)
+            strings[value] = offset
+            string_table.extend(UINT32.pack(len(encoded)))
+            string_table.extend(encoded)
+            string_table.extend(b'\0' * (-len(string_table) % 4))
+        return offset
+
+    records = []
+    tac_records = {}
+    brands_data = data.get('brands', {})
+    total_models = 0
+    total_tacs = 0
+
+    for brand_name, brand_info in brands_data.items():
+        models = brand_info.get('models', [])
+        total_models += len(models)
+        for model_dict in models:
+            for model_name, model_info in model_dict.items():
+                tacs = model_info.get('tacs', [])
+                total_tacs += len(tacs)
+                record = len(records)
+                records.append((
+                    add_string(brand_name),
+                    add_string(model_name),
+                    add_string(ALT_NAMES_SEPARATOR.join(model_info.get('alt_names', []))),
+                    add_string(model_info.get('image', '')),
+                ))
+                for tac in tacs:
+                    # Only 8-digit TACs can ever match a lookup
+                    if len(tac) == 8 and tac.isdigit():
+                        # First occurrence wins, matching IMEIDatabase's JSON index
+                        tac_records.setdefault(int(tac), record)
+
+    sorted_tacs = sorted(tac_records)
+    header = HEADER.pack(
+        MAGIC, VERSION, len(sorted_tacs), len(records), len(string_table),
+        len(brands_data), total_models, total_tacs, 0,
+        source_stat.st_size, source_stat.st_mtime_ns
+    )
+
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(struct.pack(f'<{len(sorted_tacs)}I', *sorted_tacs))
+        f.write(struct.pack(f'<{len(sorted_tacs)}I', *(tac_records[tac] for tac in sorted_tacs)))
+        f.write(struct.pack(f'<{len(records) * RECORD_FIELDS}I', *(offset for record in records for offset in record)))
+        f.write(string_table)
+    os.replace(tmp_path, index_path)
+
+    return len(brands_data), total_models, total_tacs
+
+
+class MappedTacIndex:
+    """Read-only, memory-mapped TAC index with the same get() interface as a dict index."""
+
+    def __init__(self, index_path):
+        if sys.byteorder != 'little':
+            raise ValueError("TAC index files can only be memory-mapped on little-endian hosts")
+
+        self.index_path = index_path
+        with open(index_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, self.tac_count, self.record_count, strings_size,
+         self.total_brands, self.total_models, self.total_tacs, _reserved,
+         self.source_size, self.source_mtime_ns) = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.mm.close()
+            raise ValueError(f"{index_path} is not a version {VERSION} TAC index")
+
+        self.view = view = memoryview(self.mm)
+        offset = HEADER.size
+        self.tacs = view[offset:offset + 4 * self.tac_count].cast('I')
+        offset += 4 * self.tac_count
+        self.refs = view[offset:offset + 4 * self.tac_count].cast('I')
+        offset += 4 * self.tac_count
+        self.records = view[offset:offset + 4 * RECORD_FIELDS * self.record_count].cast('I')
+        offset += 4 * RECORD_FIELDS * self.record_count
+        self.strings_offset = offset
+
+        if offset + strings_size > len(self.mm):
+            self.close()
+            raise ValueError(f"{index_path} is truncated")
+
+    def is_current(self, json_path):
+        """Check whether the index was built from the JSON file as it is now."""
+        try:
+            source_stat = os.stat(json_path)
+        except FileNotFoundError:
+            return True
+        return (source_stat.st_size == self.source_size and
+                source_stat.st_mtime_ns == self.source_mtime_ns)
+
+    def read_string(self, offset):
+        start = self.strings_offset + offset
+        length = UINT32.unpack_from(self.mm, start)[0]
+        return self.mm[start + 4:start + 4 + length].decode('utf-8')
+
+    def read_record(self, record):
+        base = record * RECORD_FIELDS
+        brand_name, model_name, alt_names, image = (
+            self.read_string(self.records[base + field]) for field in range(RECORD_FIELDS)
+        )
+        return (
+            brand_name,
+            model_name,
+            alt_names.split(ALT_NAMES_SEPARATOR) if alt_names else [],
+            image
+        )
+
+    def get(self, tac, default=None):
+        """Binary-search a TAC and return its (brand, model, alt_names, image) entry."""
+        if len(tac) != 8 or not tac.isdigit():
+            return default
+        key = int(tac)
+        position = bisect.bisect_left(self.tacs, key)
+        if position < self.tac_count and self.tacs[position] == key:
+            return self.read_record(self.refs[position])
+        return default
+
+    def items(self):
+        """Yield (tac, entry) pairs in TAC order."""
+        for position in range(self.tac_count):
+            yield f"{self.tacs[position]:08d}", self.read_record(self.refs[position])
+
+    def __len__(self):
+        return self.tac_count
+
+    def close(self):
+        self.tacs.release()
+        self.refs.release()
+        self.records.release()
+        self.view.release()
+        self.mm.close()
+
+
+def main():
+    json_paths = sys.argv[1:] or [path for path in DEFAULT_DATABASES if os.path.exists(path)]
+    if not json_paths:
+        print("❌ Error: No JSON databases found")
+        return
+
+    for json_path in json_paths:
+        index_path = default_index_path(json_path)
+        brands, models, tacs = build_index(json_path, index_path)
+        print(f"✅ {json_path} -> {index_path}: {brands:,} brands, {models:,} models, "
+              f"{tacs:,} TACs ({os.path.getsize(index_path):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()